@@ -1,15 +1,121 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import pandas as pd
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import time
+import warnings
 import joblib
+import numpy as np
 
-from preprocess import preprocess_new_data
+from batching import MicroBatcher
+from cache import PredictionCache, feature_key
+from forecast import recursive_forecast
+from forest import FlatForest
+from inference import InferenceExecutor, QueueFullError
+from model_loading import ModelRegistry
+from preprocess import FeatureEncoder
+from service_logging import RequestTimer, get_logger, log_event
 
-app = FastAPI()
+logger = get_logger("groundwater-api")
 
-# Load model and training columns once at startup
-model = joblib.load("groundwater_model.pkl")
-training_columns = joblib.load("training_columns.pkl")
+# The forest is unpickled on first use or by a background preload
+# (MODEL_PRELOAD), so the port is up before it is; see /readyz
+models = ModelRegistry(logger)
+
+
+def load_in_worker():
+    """Process-pool initializer: a spawned worker loads the forest before its first call."""
+    groundwater_model.get_or_none()
+
+
+# Dedicated bounded pool for encoding + model.predict
+# (INFERENCE_EXECUTOR=thread|process, INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE)
+executor = InferenceExecutor.from_env(initializer=load_in_worker)
+
+# Seconds clients are told to wait when the inference queue is full
+RETRY_AFTER_S = os.environ.get("INFERENCE_RETRY_AFTER", "1")
+
+
+# Coalesce concurrent single-well /predict calls into one predict call
+# (MICROBATCH=1, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS)
+MICROBATCH = os.environ.get("MICROBATCH", "0") == "1"
+batcher = None  # created below, once predict_records exists
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if batcher is not None:
+        await batcher.stop()
+    executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# "sklearn" serves the pickled RandomForestRegressor, "flat" serves the
+# flattened arrays written by forest.py (same predictions, no joblib dispatch)
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "sklearn")
+
+# With the flat backend, memory-map the node arrays read-only so workers
+# share them through the page cache (MODEL_MMAP=0 loads a private copy)
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "1") != "0"
+
+MODEL_PATH = "groundwater_forest.joblib" if MODEL_BACKEND == "flat" else "groundwater_model.pkl"
+
+
+def load_groundwater_model():
+    if MODEL_BACKEND == "flat":
+        return FlatForest.load(MODEL_PATH, mmap_mode="r" if MODEL_MMAP else None)
+    with models.timed("import sklearn"):
+        import sklearn.ensemble  # noqa: F401  (what unpickling the forest pulls in)
+    return joblib.load(MODEL_PATH)
+
+
+def warmup_groundwater_model(model, batch_size):
+    # Straight to the model: warm-up rows must not land in the prediction cache
+    model.predict(np.zeros((batch_size, len(training_columns))))
+
+
+# Single-well /predict, and a typical micro-batch / /predict/batch size
+groundwater_model = models.add(
+    "groundwater",
+    load_groundwater_model,
+    warmup=warmup_groundwater_model,
+    batch_sizes=(1, int(os.environ.get("MICROBATCH_MAX_SIZE", "32"))),
+)
+
+# Training columns and vocabularies are small; load them at import
+with models.timed("load training columns"):
+    training_columns = joblib.load("training_columns.pkl")
+
+# Training-time district/WLCODE codes; without them every category is unknown
+if os.path.exists("category_vocab.pkl"):
+    vocabularies = joblib.load("category_vocab.pkl")
+else:
+    log_event(logger, "category_vocab.pkl not found, re-run train_model.py", level=logging.WARNING)
+    vocabularies = None
+
+# Compiled replacement for preprocess_new_data (kept there as the reference)
+encoder = FeatureEncoder(training_columns, vocabularies)
+
+# The forest was fitted on a DataFrame; we feed it the encoder's plain
+# array in the same column order.
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Cache of predictions keyed on the encoded feature row, bound to the
+# model and encoder this process loaded; new artifacts on disk take effect
+# (with an empty cache) on restart
+# (PREDICTION_CACHE=0 to disable, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S)
+if os.environ.get("PREDICTION_CACHE", "1") != "0":
+    prediction_cache = PredictionCache(
+        max_size=int(os.environ.get("PREDICTION_CACHE_SIZE", "10000")),
+        ttl_s=float(os.environ.get("PREDICTION_CACHE_TTL_S", "3600")),
+    )
+else:
+    prediction_cache = None
 
 
 class PredictionRequest(BaseModel):
@@ -36,26 +142,252 @@ class PredictionResponse(BaseModel):
     predicted_level: float
 
 
-@app.post("/predict", response_model=PredictionResponse)
-def predict(req: PredictionRequest):
+class BatchPredictionItem(BaseModel):
+    predicted_level: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[BatchPredictionItem]
+
+
+class ForecastRequest(BaseModel):
+    wells: List[PredictionRequest]
+    horizon: int = Field(12, ge=1, le=60)       # number of steps
+    step_months: int = Field(1, ge=1, le=12)    # months between steps
+
+
+class WellForecast(BaseModel):
+    WLCODE: str
+    dates: List[str]
+    levels: List[float]
+
+
+class ForecastResponse(BaseModel):
+    forecasts: List[WellForecast]
+
+
+def predict_records(records, timings=None):
+    """
+    Encode a list of request dicts and run one vectorized predict.
+
+    If a `timings` dict is given, preprocess_s and inference_s are stored
+    in it (only visible to the caller with the thread executor).
+    """
+    start = time.perf_counter()
+    X_new = encoder.encode_many(records)
+    encoded = time.perf_counter()
+    y_pred = _predict_cached(X_new)
+    if timings is not None:
+        timings["preprocess_s"] = encoded - start
+        timings["inference_s"] = time.perf_counter() - encoded
+    return y_pred
+
+
+def _predict_cached(X_new):
+    model = groundwater_model.get()
+    if prediction_cache is None:
+        return model.predict(X_new)
+
+    prediction_cache.bind(model, encoder)
+    keys = [feature_key(row) for row in X_new]
+    y_pred = np.empty(len(X_new), dtype=np.float64)
+    misses = []
+    for i, key in enumerate(keys):
+        cached = prediction_cache.get(key)
+        if cached is None:
+            misses.append(i)
+        else:
+            y_pred[i] = cached
+
+    # Only the rows we have not seen go through the model
+    if misses:
+        y_new = model.predict(X_new[misses])
+        for i, y in zip(misses, y_new):
+            y_pred[i] = y
+            prediction_cache.put(keys[i], float(y))
+
+    return y_pred
+
+
+if MICROBATCH:
+    batcher = MicroBatcher(
+        predict_records,
+        executor.run,
+        max_batch_size=int(os.environ.get("MICROBATCH_MAX_SIZE", "32")),
+        max_wait_s=float(os.environ.get("MICROBATCH_MAX_WAIT_MS", "5")) / 1000.0,
+    )
+
+
+models.preload_from_env()
+
+
+async def run_inference(records, timings=None):
+    """Run predict_records on the inference pool, 503 when it is saturated."""
+    if batcher is not None and len(records) == 1:
+        return [await run_on_executor(batcher.submit, records[0])]
+    return await run_on_executor(executor.run, predict_records, records, timings)
+
+
+async def run_on_executor(submit, *args):
     try:
-        # Convert request body to DataFrame
-        raw = req.dict()
-        print("RAW REQUEST:", raw)
+        return await submit(*args)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": RETRY_AFTER_S}
+        )
+
+
+def mark_inference(timer, timings):
+    """Split the awaited inference call into queue/preprocess/inference."""
+    timer.mark("inference")
+    if "preprocess_s" in timings:
+        awaited = timer.timings["inference_ms"]
+        preprocess_ms = timings["preprocess_s"] * 1000.0
+        inference_ms = timings["inference_s"] * 1000.0
+        timer.timings["preprocess_ms"] = round(preprocess_ms, 3)
+        timer.timings["inference_ms"] = round(inference_ms, 3)
+        timer.timings["queue_ms"] = round(max(0.0, awaited - preprocess_ms - inference_ms), 3)
+
+
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    timer = RequestTimer()
+    request.state.timer = timer
+    request.state.log_fields = {}
+    response = await call_next(request)
+    if request.url.path.startswith(("/predict", "/forecast")):
+        timer.mark("serialize")
+        log_event(
+            logger,
+            "request",
+            sampled=True,
+            path=request.url.path,
+            status=response.status_code,
+            **request.state.log_fields,
+            **timer.fields(),
+        )
+    return response
+
+
+@app.get("/healthz")
+def healthz():
+    return models.health()
 
-        raw_df = pd.DataFrame([raw])
-        print("DATE VALUE:", raw_df["Date"].iloc[0])
 
-        # Apply same preprocessing as during training
-        X_new = preprocess_new_data(raw_df, training_columns)
+@app.get("/readyz")
+def readyz():
+    body, status = models.readiness()
+    return JSONResponse(body, status_code=status)
 
-        # Run model prediction
-        y_pred = model.predict(X_new)[0]
+
+@app.get("/inference/stats")
+def inference_stats():
+    """Queue depth and wait times of the inference pool, for sizing it."""
+    stats = executor.stats()
+    if batcher is not None:
+        stats["microbatch"] = batcher.stats()
+    if prediction_cache is not None:
+        # Per process: with INFERENCE_EXECUTOR=process each worker has its own
+        stats["cache"] = prediction_cache.stats()
+    return stats
+
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict(req: PredictionRequest, request: Request):
+    timer = request.state.timer
+    timer.mark("decode")
+    try:
+        raw = req.dict()
+        request.state.log_fields["wlcode"] = raw["WLCODE"]
+
+        # Apply same preprocessing as during training and run the model
+        timings = {}
+        y_pred = (await run_inference([raw], timings))[0]
+        mark_inference(timer, timings)
 
         return PredictionResponse(predicted_level=float(y_pred))
 
-    except Exception as e:
-        # Log the error to the console for debugging
-        print("PREDICT ERROR:", repr(e))
+    except HTTPException:
+        raise
+    except Exception:
+        log_event(logger, "predict failed", level=logging.ERROR, exc_info=True)
         # Re-raise so FastAPI returns 500 with detail
-        raise
\ No newline at end of file
+        raise
+
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(items: List[Dict[str, Any]], request: Request):
+    """
+    Predict many wells in one call.
+
+    Each item is validated on its own so one bad well does not fail the
+    whole batch; valid items are encoded into a single feature matrix and
+    sent through one model.predict. Results come back in input order.
+    """
+    timer = request.state.timer
+    timer.mark("decode")
+    request.state.log_fields["items"] = len(items)
+
+    results: List[BatchPredictionItem] = [None] * len(items)
+    valid_rows = []
+    valid_idx = []
+
+    for i, item in enumerate(items):
+        try:
+            valid_rows.append(PredictionRequest(**item).dict())
+            valid_idx.append(i)
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+                for err in e.errors()
+            )
+            results[i] = BatchPredictionItem(error=f"Invalid request: {detail}")
+
+    if valid_rows:
+        try:
+            timings = {}
+            y_pred = await run_inference(valid_rows, timings)
+            mark_inference(timer, timings)
+            for i, y in zip(valid_idx, y_pred):
+                results[i] = BatchPredictionItem(predicted_level=float(y))
+        except HTTPException:
+            raise
+        except Exception as e:
+            log_event(logger, "predict batch failed", level=logging.ERROR, exc_info=True)
+            for i in valid_idx:
+                results[i] = BatchPredictionItem(error=f"Prediction failed: {e}")
+
+    return BatchPredictionResponse(predictions=results)
+
+
+@app.post("/forecast", response_model=ForecastResponse)
+async def forecast(body: ForecastRequest, request: Request):
+    """
+    Forecast several steps ahead for many wells.
+
+    The lag is rolled forward on the server: step h+1 uses the step h
+    prediction as Water_Level_Lag1, and every step predicts all wells in
+    one call, so N wells x H steps is H vectorized predictions.
+    """
+    timer = request.state.timer
+    timer.mark("decode")
+    request.state.log_fields.update(wells=len(body.wells), horizon=body.horizon)
+
+    records = [w.dict() for w in body.wells]
+    dates, levels = await run_on_executor(
+        executor.run,
+        recursive_forecast,
+        predict_records,
+        records,
+        body.horizon,
+        body.step_months,
+    )
+    timer.mark("inference")
+
+    return ForecastResponse(
+        forecasts=[
+            WellForecast(WLCODE=r["WLCODE"], dates=d, levels=[float(y) for y in row])
+            for r, d, row in zip(records, dates, levels)
+        ]
+    )
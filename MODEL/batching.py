@@ -0,0 +1,99 @@
+"""
+Request-level micro-batching for the groundwater model.
+
+Concurrent single-well /predict calls each submit() their encoded
+request dict; a background task collects them for up to `max_wait_s`
+(or until `max_batch_size` items are waiting), runs them through one
+predict call on the inference executor, and resolves every waiting
+request with its own row of the result.
+"""
+import asyncio
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, run, max_batch_size=32, max_wait_s=0.005):
+        """
+        predict_fn: list of records -> sequence of predictions
+        run:        coroutine that executes predict_fn(records) off the loop,
+                    e.g. InferenceExecutor.run
+        """
+        self.predict_fn = predict_fn
+        self.run = run
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_s
+
+        self._queue = None
+        self._task = None
+        self._inflight = set()
+
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, record):
+        """Queue one record and wait for its prediction."""
+        if self._task is None or self._task.get_loop() is not asyncio.get_running_loop():
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future))
+        return await future
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._task = None
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait_s
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Dispatch without waiting so the next batch can start filling
+            # while this one runs; the executor bounds real concurrency.
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch):
+        records = [record for record, _ in batch]
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run(self.predict_fn, records)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_s * 1000.0,
+            "batches": self.batches,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
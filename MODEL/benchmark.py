@@ -0,0 +1,265 @@
+"""
+Latency and memory benchmarks for the groundwater model backends.
+
+Usage:
+    python benchmark.py backends      # sklearn vs flat forest, p50/p99 + RSS
+    python benchmark.py workers -n 4  # startup time and RSS/PSS across N workers
+    python benchmark.py load -c 64    # /predict throughput, per-request vs micro-batched
+
+`workers` accepts --pickle/--flat to point at other forests, e.g. the soil
+models: --pickle ../projectavishkar/soil_model_N.pkl
+         --flat ../projectavishkar/soil_model_N.flat.joblib
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+from forest import FlatForest
+
+warnings.filterwarnings("ignore")
+
+MODEL_PATH = "groundwater_model.pkl"
+FOREST_PATH = "groundwater_forest.joblib"
+
+
+def load_backend(name):
+    if name == "flat":
+        return FlatForest.load(FOREST_PATH)
+    return joblib.load(MODEL_PATH)
+
+
+def sample_features(n, n_features, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 366, size=(n, n_features)).astype(np.float64)
+
+
+def time_calls(fn, repeats):
+    """Return per-call latencies in milliseconds."""
+    fn()  # warm-up
+    out = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - start) * 1000.0)
+    return out
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q))
+
+
+def rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def measure_backend(name):
+    """Run in a fresh process so RSS only reflects this backend."""
+    before = rss_mb()
+    start = time.perf_counter()
+    model = load_backend(name)
+    load_ms = (time.perf_counter() - start) * 1000.0
+    after_load = rss_mb()
+
+    results = {"backend": name, "load_ms": load_ms, "rss_load_mb": after_load - before}
+    for batch in (1, 100, 1000):
+        X = sample_features(batch, model.n_features_in_)
+        lat = time_calls(lambda: model.predict(X), repeats=50 if batch < 1000 else 10)
+        results[f"batch_{batch}"] = {
+            "p50_ms": percentile(lat, 50),
+            "p99_ms": percentile(lat, 99),
+            "mean_ms": statistics.mean(lat),
+        }
+    results["rss_peak_mb"] = rss_mb()
+    return results
+
+
+def bench_backends():
+    for name in ("sklearn", "flat"):
+        proc = subprocess.run(
+            [sys.executable, __file__, "_measure", name],
+            capture_output=True, text=True, check=True,
+        )
+        res = json.loads(proc.stdout)
+        print(f"\n=== {name} ===")
+        print(f"load: {res['load_ms']:.1f} ms, +{res['rss_load_mb']:.1f} MB RSS "
+              f"(peak {res['rss_peak_mb']:.1f} MB)")
+        for batch in (1, 100, 1000):
+            r = res[f"batch_{batch}"]
+            print(f"batch {batch:5d}: p50 {r['p50_ms']:.3f} ms  p99 {r['p99_ms']:.3f} ms")
+
+
+def read_smaps_rollup():
+    """Rss and Pss (shared pages split between processes) in MB."""
+    out = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                out[key.lower() + "_mb"] = int(rest.split()[0]) / 1024.0
+    return out
+
+
+def _worker(mode, path, barrier, results):
+    start = time.perf_counter()
+    if mode == "pickle":
+        model = joblib.load(path)
+    else:
+        model = FlatForest.load(path, mmap_mode="r" if mode == "flat-mmap" else None)
+    load_ms = (time.perf_counter() - start) * 1000.0
+
+    # Touch the model the way a request would
+    model.predict(sample_features(1000, model.n_features_in_))
+
+    barrier.wait()  # everyone loaded -> shared pages are counted once
+    stats = {"load_ms": load_ms, **read_smaps_rollup()}
+    results.put(stats)
+    barrier.wait()
+
+
+def bench_workers(n_workers, pickle_path, flat_path):
+    ctx = mp.get_context("spawn")
+    for mode, path in (("pickle", pickle_path), ("flat", flat_path), ("flat-mmap", flat_path)):
+        barrier = ctx.Barrier(n_workers)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(mode, path, barrier, results)) for _ in range(n_workers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        stats = [results.get() for _ in procs]
+        ready_s = time.perf_counter() - start
+        for p in procs:
+            p.join()
+
+        print(f"\n=== {mode} x{n_workers} ({path}) ===")
+        print(f"all workers ready after {ready_s:.2f} s")
+        print(f"load per worker: {statistics.mean(s['load_ms'] for s in stats):.1f} ms")
+        print(f"RSS per worker:  {statistics.mean(s['rss_mb'] for s in stats):.1f} MB")
+        print(f"total PSS:       {sum(s['pss_mb'] for s in stats):.1f} MB")
+
+
+SAMPLE_REQUEST = {
+    "state": "Maharashtra",
+    "district": "Thane",
+    "LAT": 19.2183,
+    "LON": 72.9781,
+    "SITE_TYPE": "Observation",
+    "WLCODE": "W1",
+    "Date": "2024-05-01",
+    "Season": "Summer",
+    "Rainfall_monthly": 12,
+    "Rainfall_seasonal": 180,
+    "Annual_Ground_Water_Draft_Total": 1.0,
+    "Annual_Replenishable_Groundwater_Resource": 1.0,
+    "Net_Ground_Water_Availability": 1.0,
+    "Stage_of_development": 1.0,
+    "Stage_of_development_calc": 1.0,
+    "Exploitation_Ratio": 1.0,
+    "Water_Level_Lag1": 24.0,
+}
+
+
+async def _drive_load(app, concurrency, total):
+    import httpx
+
+    latencies = []
+    statuses = {}
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            # Vary an encoded field (day_of_year), so requests are not identical rows
+            day = np.datetime64("2024-01-01") + np.timedelta64(i % 366, "D")
+            body = dict(SAMPLE_REQUEST, Date=str(day))
+            async with sem:
+                start = time.perf_counter()
+                resp = await client.post("/predict", json=body)
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+
+        await one(0)  # warm-up
+        latencies.clear()
+        statuses.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "statuses": statuses,
+    }
+
+
+def measure_load(concurrency, total):
+    import api
+
+    result = asyncio.run(_drive_load(api.app, concurrency, total))
+    if api.batcher is not None:
+        result["microbatch"] = api.batcher.stats()
+    return result
+
+
+def bench_load(concurrency, total, backend):
+    modes = (("per-request", {"MICROBATCH": "0"}), ("micro-batched", {"MICROBATCH": "1"}))
+    for name, env in modes:
+        proc = subprocess.run(
+            [sys.executable, __file__, "_load", "-c", str(concurrency), "-r", str(total)],
+            capture_output=True, text=True, check=True,
+            # Without the prediction cache, so every request reaches the model
+            env={**os.environ, "MODEL_BACKEND": backend, "PREDICTION_CACHE": "0", **env},
+        )
+        res = json.loads(proc.stdout)
+        print(f"\n=== {name} ({backend}, concurrency {concurrency}, {total} requests) ===")
+        print(f"throughput: {res['rps']:.0f} req/s")
+        print(f"latency:    p50 {res['p50_ms']:.2f} ms  p99 {res['p99_ms']:.2f} ms")
+        print(f"statuses:   {res['statuses']}")
+        if "microbatch" in res:
+            print(f"batches:    {res['microbatch']['batches']} "
+                  f"(avg size {res['microbatch']['avg_batch_size']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("backends")
+    workers = sub.add_parser("workers")
+    workers.add_argument("-n", "--workers", type=int, default=4)
+    workers.add_argument("--pickle", default=MODEL_PATH)
+    workers.add_argument("--flat", default=FOREST_PATH)
+    for name in ("load", "_load"):
+        load = sub.add_parser(name)
+        load.add_argument("-c", "--concurrency", type=int, default=64)
+        load.add_argument("-r", "--requests", type=int, default=2000)
+        load.add_argument("--backend", default="sklearn", choices=["sklearn", "flat"])
+    measure = sub.add_parser("_measure")
+    measure.add_argument("backend")
+    args = parser.parse_args()
+
+    if args.cmd == "backends":
+        bench_backends()
+    elif args.cmd == "workers":
+        bench_workers(args.workers, args.pickle, args.flat)
+    elif args.cmd == "load":
+        bench_load(args.concurrency, args.requests, args.backend)
+    elif args.cmd == "_load":
+        print(json.dumps(measure_load(args.concurrency, args.requests)))
+    elif args.cmd == "_measure":
+        print(json.dumps(measure_backend(args.backend)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Recursive multi-step groundwater forecasts.
+
+Step 0 is exactly what /predict would return for the request. Each later
+step advances every well's Date by `step_months`, derives its Season from
+the new month, feeds the previous prediction back in as Water_Level_Lag1
+and predicts all wells in one vectorized call, so an N-well x H-step
+forecast costs H predict calls.
+"""
+import calendar
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+# Month -> Season as labelled in final_merged_dataset.csv
+SEASON_BY_MONTH = {
+    1: "Winter", 2: "Winter", 3: "Summer", 4: "Summer", 5: "Summer",
+    6: "Monsoon", 7: "Monsoon", 8: "Monsoon", 9: "Monsoon",
+    10: "Post-Monsoon", 11: "Post-Monsoon", 12: "Winter",
+}
+
+
+def parse_date(value):
+    """Request date as a datetime.date; invalid dates become today, as in preprocess."""
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except ValueError:
+        ts = pd.to_datetime(value, errors="coerce")
+        if pd.isna(ts):
+            return date.today()
+        return ts.date()
+
+
+def add_months(d, months):
+    month_index = d.month - 1 + months
+    year = d.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(d.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+def recursive_forecast(predict_fn, records, horizon, step_months=1):
+    """
+    Roll `records` forward `horizon` steps.
+
+    predict_fn: list of request dicts -> sequence of predicted levels
+    Returns (dates, levels): dates[i][h] is the ISO date of step h for
+    well i, levels has shape (n_wells, horizon).
+    """
+    current = [dict(r) for r in records]
+    start = [parse_date(r["Date"]) for r in current]
+    levels = np.empty((len(current), horizon), dtype=np.float64)
+    dates = [[] for _ in current]
+
+    for h in range(horizon):
+        for i, record in enumerate(current):
+            d = add_months(start[i], step_months * h)
+            if h > 0:
+                record["Date"] = d.isoformat()
+                record["Season"] = SEASON_BY_MONTH[d.month]
+            dates[i].append(d.isoformat())
+
+        levels[:, h] = predict_fn(current)
+        for record, level in zip(current, levels[:, h]):
+            record["Water_Level_Lag1"] = float(level)
+
+    return dates, levels
@@ -0,0 +1,194 @@
+"""
+Compact inference engine for sklearn random forests.
+
+export_forest() flattens every tree of a fitted RandomForestRegressor or
+RandomForestClassifier into a handful of contiguous NumPy arrays
+(feature, threshold, left, right, value) and saves them with joblib.
+FlatForest then predicts a whole batch by walking all trees at once with
+NumPy indexing, without joblib dispatch or per-estimator Python calls.
+
+fuse_forests() does the same for several single-output regressors fitted
+on the same features (e.g. the N, P, K and pH soil models): one walk over
+all their trees returns every target, with the same predictions as the
+separate models.
+
+Usage:
+    python forest.py groundwater_model.pkl groundwater_forest.joblib
+"""
+import sys
+
+import joblib
+import numpy as np
+
+
+def flatten_forest(model):
+    """Concatenate the nodes of every tree in `model` into flat arrays."""
+    is_classifier = hasattr(model, "classes_")
+    if is_classifier and model.n_outputs_ != 1:
+        raise ValueError("Only single-output classifiers can be flattened")
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for est in model.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        leaf = left == -1
+        own = np.arange(n, dtype=np.int32)
+
+        # Leaves point at themselves so a fixed number of steps is enough
+        left = np.where(leaf, own, left) + offset
+        right = np.where(leaf, own, right) + offset
+        feature = np.where(leaf, 0, tree.feature).astype(np.int32)
+
+        if is_classifier:
+            # (n_nodes, 1, n_classes) -> per-leaf class probabilities
+            value = tree.value[:, 0, :]
+            value = value / value.sum(axis=1, keepdims=True)
+        else:
+            # (n_nodes, n_outputs, 1) -> (n_nodes, n_outputs)
+            value = tree.value[:, :, 0]
+
+        features.append(feature)
+        thresholds.append(tree.threshold)
+        lefts.append(left)
+        rights.append(right)
+        values.append(value)
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": int(max_depth),
+        "n_features": int(model.n_features_in_),
+    }
+    if is_classifier:
+        arrays["classes"] = np.asarray(model.classes_)
+    return arrays
+
+
+def fuse_forests(models):
+    """
+    Flatten single-output regressors into one forest with one output per
+    model. Nodes keep their single leaf value; tree_output says which
+    model (output column) each tree belongs to, and FlatForest averages
+    each column over that model's own trees.
+    """
+    parts = [flatten_forest(m) for m in models]
+    if any("classes" in p or p["value"].shape[1] != 1 for p in parts):
+        raise ValueError("Only single-output regressors can be fused")
+    if len({p["n_features"] for p in parts}) != 1:
+        raise ValueError("Fused forests must share the same input features")
+
+    offset = 0
+    lefts, rights, roots = [], [], []
+    for p in parts:
+        # Node indices were relative to this part's own arrays
+        lefts.append(p["left"] + offset)
+        rights.append(p["right"] + offset)
+        roots.append(p["roots"] + offset)
+        offset += len(p["value"])
+
+    return {
+        "feature": np.concatenate([p["feature"] for p in parts]),
+        "threshold": np.concatenate([p["threshold"] for p in parts]),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "value": np.ascontiguousarray(np.concatenate([p["value"] for p in parts]), dtype=np.float64),
+        "roots": np.concatenate(roots).astype(np.int32),
+        "tree_output": np.concatenate(
+            [np.full(len(p["roots"]), k, dtype=np.int32) for k, p in enumerate(parts)]
+        ),
+        "max_depth": max(p["max_depth"] for p in parts),
+        "n_features": parts[0]["n_features"],
+    }
+
+
+def export_forest(model, path):
+    """Flatten `model` and save it uncompressed to `path`."""
+    joblib.dump(flatten_forest(model), path)
+
+
+def export_fused_forest(models, path):
+    """fuse_forests(models), saved uncompressed to `path`."""
+    joblib.dump(fuse_forests(models), path)
+
+
+class FlatForest:
+    """
+    Batch predictor over flattened forest arrays.
+
+    Mirrors the predict / predict_proba interface of the sklearn forest it
+    was exported from.
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.max_depth = arrays["max_depth"]
+        self.n_features_in_ = arrays["n_features"]
+        self.n_estimators = len(self.roots)
+        self.classes_ = arrays.get("classes")
+        # Fused forests: column k of the output is the mean over the trees
+        # with tree_output == k, as one (n_estimators, n_outputs) product
+        tree_output = arrays.get("tree_output")
+        self.output_weights = None
+        if tree_output is not None:
+            onehot = np.eye(tree_output.max() + 1)[tree_output]
+            self.output_weights = onehot / onehot.sum(axis=0)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        return cls(joblib.load(path, mmap_mode=mmap_mode))
+
+    def _leaf_values(self, X):
+        """Mean leaf value over the trees of each output, shape (n_samples, n_values)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"Expected input of shape (n, {self.n_features_in_}), got {X.shape}"
+            )
+
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        if self.output_weights is not None:
+            return self.value[node, 0] @ self.output_weights
+        return self.value[node].mean(axis=1)
+
+    def predict(self, X):
+        out = self._leaf_values(X)
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(out, axis=1)]
+        return out[:, 0] if out.shape[1] == 1 else out
+
+    def predict_proba(self, X):
+        if self.classes_ is None:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._leaf_values(X)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python forest.py <model.pkl> <output.joblib>")
+        sys.exit(1)
+
+    export_forest(joblib.load(sys.argv[1]), sys.argv[2])
+    print(f"Exported {sys.argv[1]} -> {sys.argv[2]}")
@@ -0,0 +1,115 @@
+"""
+Bounded executor for running model inference off the event loop.
+
+The FastAPI endpoints await InferenceExecutor.run() instead of calling
+the model inline. Work goes to a dedicated thread or process pool, and at
+most `workers + queue_size` calls may be pending at once; beyond that
+run() raises QueueFullError so the endpoint can answer 503 right away
+instead of piling requests up in Starlette's threadpool.
+
+Process workers are started with the "spawn" method, never forked. A
+forked worker would copy the parent's locks as they are at that moment,
+e.g. a LazyModel lock held by the background preload, and then wait on
+it forever. Each spawned worker imports the service afresh and runs
+`initializer` (typically: load the model) before it takes any work.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue is at capacity."""
+
+
+def _timed_call(fn, args):
+    # Runs inside the pool; wall-clock time so it works across processes
+    return time.time(), fn(*args)
+
+
+class InferenceExecutor:
+    def __init__(self, kind="thread", workers=None, queue_size=64, initializer=None):
+        self.kind = kind
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.queue_size = queue_size
+
+        if kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+            )
+        elif kind == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="inference"
+            )
+        else:
+            raise ValueError(f"Unknown executor kind: {kind!r}")
+
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    @classmethod
+    def from_env(cls, initializer=None):
+        """
+        Configure from INFERENCE_EXECUTOR / _WORKERS / _QUEUE_SIZE.
+        `initializer` only runs in process workers.
+        """
+        workers = os.environ.get("INFERENCE_WORKERS")
+        return cls(
+            kind=os.environ.get("INFERENCE_EXECUTOR", "thread"),
+            workers=int(workers) if workers else None,
+            queue_size=int(os.environ.get("INFERENCE_QUEUE_SIZE", "64")),
+            initializer=initializer,
+        )
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_size
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool; raise QueueFullError when saturated."""
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Inference queue full ({self.pending}/{self.capacity} pending)"
+            )
+
+        self.pending += 1
+        enqueued = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(
+                self._pool, _timed_call, fn, args
+            )
+        finally:
+            self.pending -= 1
+
+        wait = max(0.0, started - enqueued)
+        self.completed += 1
+        self.total_wait_s += wait
+        self.max_wait_s = max(self.max_wait_s, wait)
+        return result
+
+    def stats(self):
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "queue_depth": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_s / self.completed * 1000.0, 3)
+            if self.completed
+            else 0.0,
+            "max_wait_ms": round(self.max_wait_s * 1000.0, 3),
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
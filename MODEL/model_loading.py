@@ -0,0 +1,224 @@
+"""
+Lazy, thread-safe model loading shared by the inference services
+(MODEL/api.py, backend/server.py, backend/disease_api.py,
+backend/soil_server.py).
+
+Importing a service no longer loads TensorFlow or unpickles forests.
+Each model is registered with a loader; the first get() runs it under a
+lock (concurrent callers wait for the same load), and a background
+preload can start right after import so the port is up at once. The
+services expose:
+
+    /healthz   the process is up (always 200)
+    /readyz    every registered model is loaded and warmed (200) or not
+               yet (503), with per-model state and the startup phase timings
+
+A model can be registered with a warm-up function. Right after loading,
+it runs synthetic inputs of each expected batch size through the model
+(graph tracing, allocator and lazy library set-up) before the model
+counts as ready, so the first real request does not pay for that. Each
+batch size is timed and logged as a "warmup" event.
+
+Every load, plus any block wrapped in `registry.timed(...)` (e.g. heavy
+imports), is timed, logged as a "startup phase" event and listed in
+/readyz, slowest first. For a per-module breakdown of imports, run the
+service under `python -X importtime`.
+
+Environment:
+    MODEL_PRELOAD       background (default): load in a thread after import
+                        eager: load during import, the old behaviour
+                        lazy: load on first request, or when /readyz is polled
+    WARMUP              0 to skip warm-up, default 1
+    WARMUP_BATCH_SIZES  comma-separated, overrides each model's defaults
+    WARMUP_ROUNDS       passes per batch size, default 2
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from service_logging import log_event
+
+PRELOAD_MODES = ("background", "eager", "lazy")
+
+
+def warmup_batch_sizes(default):
+    """Batch sizes to warm: WARMUP_BATCH_SIZES, else `default`; none when WARMUP=0."""
+    if os.environ.get("WARMUP", "1") == "0":
+        return []
+    sizes = os.environ.get("WARMUP_BATCH_SIZES")
+    if sizes:
+        return [int(n) for n in sizes.split(",") if n.strip()]
+    return list(default)
+
+
+class LazyModel:
+    def __init__(self, name, load, registry, warmup=None, batch_sizes=(1,)):
+        self.name = name
+        self._load = load
+        self._registry = registry
+        self._warmup = warmup
+        self.batch_sizes = batch_sizes
+        self._lock = threading.Lock()
+        self._value = None
+        self.state = "pending"
+        self.error = None
+
+    @property
+    def loaded(self):
+        return self.state == "loaded"
+
+    def get(self):
+        """The loaded model; loads it on first use. A failed load is re-raised, not retried."""
+        if self.state == "loaded":
+            return self._value
+        with self._lock:
+            if self.state == "loaded":
+                return self._value
+            if self.error is not None:
+                raise self.error
+            self.state = "loading"
+            try:
+                with self._registry.timed(f"load {self.name}"):
+                    value = self._load()
+            except Exception as e:
+                self.error = e
+                self.state = "failed"
+                log_event(
+                    self._registry.logger,
+                    "model load failed",
+                    level=logging.ERROR,
+                    model=self.name,
+                    exc_info=True,
+                )
+                raise
+            if self._warmup is not None:
+                self.state = "warming"
+                self._run_warmup(value)
+            self._value = value
+            self.state = "loaded"
+            return self._value
+
+    def _run_warmup(self, value):
+        sizes = warmup_batch_sizes(self.batch_sizes)
+        if not sizes:
+            return
+        rounds = max(1, int(os.environ.get("WARMUP_ROUNDS", "2")))
+        logger = self._registry.logger
+        try:
+            with self._registry.timed(f"warmup {self.name}"):
+                for batch_size in sizes:
+                    lat = []
+                    for _ in range(rounds):
+                        start = time.perf_counter()
+                        self._warmup(value, batch_size)
+                        lat.append(round((time.perf_counter() - start) * 1000.0, 3))
+                    log_event(
+                        logger,
+                        "warmup",
+                        model=self.name,
+                        batch_size=batch_size,
+                        first_ms=lat[0],
+                        last_ms=lat[-1],
+                    )
+        except Exception:
+            # A model that loads but cannot run a dummy batch still serves;
+            # the first real request will show the actual error
+            log_event(logger, "warmup failed", level=logging.WARNING, model=self.name, exc_info=True)
+
+    def get_or_none(self):
+        """get(), but None when the model could not be loaded (already logged)."""
+        try:
+            return self.get()
+        except Exception:
+            return None
+
+    def status(self):
+        out = {"state": self.state}
+        for phase in ("load", "warmup"):
+            if f"{phase} {self.name}" in self._registry.phases:
+                out[f"{phase}_ms"] = self._registry.phases[f"{phase} {self.name}"]
+        if self.error is not None:
+            out["error"] = str(self.error)
+        return out
+
+
+class ModelRegistry:
+    def __init__(self, logger):
+        self.logger = logger
+        self.models = {}
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._preload_thread = None
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def timed(self, phase):
+        """Record how long the block takes as a startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = round((time.perf_counter() - start) * 1000.0, 3)
+            self.phases[phase] = ms
+            log_event(self.logger, "startup phase", phase=phase, ms=ms)
+
+    def add(self, name, load, warmup=None, batch_sizes=(1,)):
+        """
+        Register `load` (no arguments -> model) under `name`; returns its
+        LazyModel. `warmup(model, batch_size)` runs once per size in
+        `batch_sizes` (WARMUP_ROUNDS times) before the model counts as loaded.
+        """
+        model = LazyModel(name, load, self, warmup, batch_sizes)
+        self.models[name] = model
+        return model
+
+    def ready(self):
+        return all(m.loaded for m in self.models.values())
+
+    def load_all(self):
+        for model in self.models.values():
+            model.get_or_none()
+        log_event(
+            self.logger,
+            "models ready" if self.ready() else "models not ready",
+            level=logging.INFO if self.ready() else logging.WARNING,
+            since_start_ms=round((time.perf_counter() - self.started) * 1000.0, 3),
+            models={name: m.state for name, m in self.models.items()},
+        )
+
+    def preload(self, background=True):
+        """Load every model now, or in one daemon thread; safe to call repeatedly."""
+        with self._lock:
+            if self._preload_thread is not None:
+                return
+            self._preload_thread = threading.Thread(
+                target=self.load_all, name="model-preload", daemon=True
+            )
+            if background:
+                self._preload_thread.start()
+        if not background:
+            self._preload_thread.run()
+
+    def preload_from_env(self):
+        mode = os.environ.get("MODEL_PRELOAD", "background")
+        if mode not in PRELOAD_MODES:
+            raise ValueError(f"MODEL_PRELOAD must be one of {PRELOAD_MODES}, got {mode!r}")
+        if mode != "lazy":
+            self.preload(background=(mode == "background"))
+
+    def readiness(self):
+        """(/readyz body, HTTP status). Starts a background load if nothing has yet."""
+        self.preload(background=True)
+        ready = self.ready()
+        body = {
+            "ready": ready,
+            "models": {name: m.status() for name, m in self.models.items()},
+            "startup_ms": dict(sorted(self.phases.items(), key=lambda kv: -kv[1])),
+        }
+        return body, 200 if ready else 503
+
+    def health(self):
+        """/healthz body: the process is up, whatever the models are doing."""
+        return {"status": "ok", "uptime_s": round(time.perf_counter() - self.started, 3)}
@@ -1,10 +1,35 @@
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
 
-def preprocess_new_data(raw_df, training_columns):
+LOW_CARDINALITY_COLS = ("state", "SITE_TYPE", "Season")
+HIGH_CARDINALITY_COLS = ("district", "WLCODE")
+
+# Code given to district/WLCODE values that were not seen during training
+UNKNOWN_CODE = -1
+
+
+def build_vocabularies(df):
+    """
+    Capture the pd.factorize codes used at training time as
+    {column: {category: code}} so serving can encode with a dict lookup.
+    """
+    return {
+        col: {cat: code for code, cat in enumerate(pd.factorize(df[col])[1])}
+        for col in HIGH_CARDINALITY_COLS
+    }
+
+
+def preprocess_new_data(raw_df, training_columns, vocabularies=None):
     """
     Apply the same preprocessing steps to new data
     that were used during model training.
+
+    If `vocabularies` (from build_vocabularies) is given, district/WLCODE
+    are encoded with the training codes; otherwise they are factorized
+    within raw_df, which only matches training for the full dataset.
     """
     df = raw_df.copy()
 
@@ -27,15 +52,107 @@ def preprocess_new_data(raw_df, training_columns):
         df["Season"] = "Pre-Monsoon"
 
     # 4) One-hot encode low-cardinality features
-    low_cardinality_cols = ["state", "SITE_TYPE", "Season"]
-    df = pd.get_dummies(df, columns=low_cardinality_cols, drop_first=True)
+    df = pd.get_dummies(df, columns=list(LOW_CARDINALITY_COLS), drop_first=True)
 
     # 5) Label encode high-cardinality features
-    high_cardinality_cols = ["district", "WLCODE"]
-    for col in high_cardinality_cols:
-        df[col] = pd.factorize(df[col])[0]
+    for col in HIGH_CARDINALITY_COLS:
+        if vocabularies is None:
+            df[col] = pd.factorize(df[col])[0]
+        else:
+            vocab = vocabularies[col]
+            df[col] = [vocab.get(v, UNKNOWN_CODE) for v in df[col]]
 
     # 6) Align with training columns (add missing, drop extras)
     df = df.reindex(columns=training_columns, fill_value=0)
 
-    return df
\ No newline at end of file
+    return df
+
+
+def _day_of_year(value):
+    """Parse a request date the same way pd.to_datetime does, ISO first."""
+    try:
+        return datetime.fromisoformat(str(value)).timetuple().tm_yday
+    except ValueError:
+        pass
+
+    # Non-ISO strings go through pandas so we keep its format inference
+    ts = pd.to_datetime(value, errors="coerce")
+    if pd.isna(ts):
+        ts = pd.Timestamp.today().normalize()
+    return ts.dayofyear
+
+
+class FeatureEncoder:
+    """
+    Precompiled version of preprocess_new_data for the serving hot path.
+
+    Built once from training_columns: every one-hot value and numeric field
+    gets a fixed slot in the feature row, and high-cardinality columns are
+    encoded from stored category codes. Requests are written straight into
+    a preallocated NumPy array, no DataFrame involved. Categories missing
+    from `vocabularies` fall into the UNKNOWN_CODE bucket.
+    """
+
+    def __init__(self, training_columns, vocabularies=None):
+        self.columns = list(training_columns)
+        self.n_features = len(self.columns)
+        self.vocabularies = {
+            col: dict((vocabularies or {}).get(col, {}))
+            for col in HIGH_CARDINALITY_COLS
+        }
+
+        slot = {col: i for i, col in enumerate(self.columns)}
+
+        # (column, category) -> slot of its dummy column
+        self.one_hot_slots = {}
+        for col in LOW_CARDINALITY_COLS:
+            prefix = col + "_"
+            for name, i in slot.items():
+                if name.startswith(prefix):
+                    self.one_hot_slots[(col, name[len(prefix):])] = i
+
+        self.day_slot = slot.get("day_of_year")
+        self.label_slots = [
+            (col, slot[col]) for col in HIGH_CARDINALITY_COLS if col in slot
+        ]
+
+        # Everything else is passed through as a plain number
+        special = set(HIGH_CARDINALITY_COLS) | {"day_of_year"}
+        one_hot = set(self.one_hot_slots.values())
+        self.numeric_slots = [
+            (name, i)
+            for name, i in slot.items()
+            if name not in special and i not in one_hot
+        ]
+
+    def encode_into(self, record, out):
+        """Write one request dict into a zeroed feature row `out`."""
+        if self.day_slot is not None:
+            out[self.day_slot] = _day_of_year(record.get("Date"))
+
+        for col, i in self.label_slots:
+            out[i] = self.vocabularies[col].get(record.get(col), UNKNOWN_CODE)
+
+        for col in LOW_CARDINALITY_COLS:
+            # Missing Season falls back to Pre-Monsoon, as in the pandas path
+            value = record.get(col, "Pre-Monsoon" if col == "Season" else None)
+            i = self.one_hot_slots.get((col, value))
+            if i is not None:
+                out[i] = 1.0
+
+        for name, i in self.numeric_slots:
+            value = record.get(name, 0)
+            out[i] = np.nan if value is None else value
+
+        return out
+
+    def encode_many(self, records):
+        """Encode a list of request dicts into a (n, n_features) array."""
+        X = np.zeros((len(records), self.n_features), dtype=np.float64)
+        for row, record in zip(X, records):
+            self.encode_into(record, row)
+        return X
+
+    def encode(self, record):
+        """Encode a single request dict into a (1, n_features) array."""
+        return self.encode_many([record])
@@ -0,0 +1,129 @@
+"""
+Structured, non-blocking logging shared by the inference services
+(MODEL/api.py, backend/server.py, backend/soil_server.py).
+
+Records are put on an in-memory queue by the request thread and written
+as one JSON object per line to stderr by a background QueueListener, so
+a slow console never sits on the request path.
+
+Environment:
+    LOG_LEVEL        minimum level, default INFO
+    LOG_SAMPLE_RATE  fraction of per-request logs to keep (0..1), default 1.0;
+                     warnings and errors are always kept
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "service": record.name,
+            "event": record.getMessage(),
+        }
+        out.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Keep message and fields separate; the default prepare() would
+        # fold the traceback into the message text.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """Drop a share of records marked sampled=True below WARNING."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+def _start_listener():
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(
+        queue.SimpleQueue(), handler, respect_handler_level=False
+    )
+    _listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def get_logger(service):
+    """Logger for `service` that writes JSON lines through the shared queue."""
+    logger = logging.getLogger(service)
+    if getattr(logger, "_structured", False):
+        return logger
+
+    listener = _start_listener()
+    handler = _QueueHandler(listener.queue)
+    handler.addFilter(SampleFilter(float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))))
+
+    logger.addHandler(handler)
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+    logger._structured = True
+    return logger
+
+
+def log_event(logger, event, level=logging.INFO, sampled=False, exc_info=None, **fields):
+    """Log `event` with structured fields; sampled=True for per-request logs."""
+    if logger.isEnabledFor(level):
+        logger.log(
+            level, event, exc_info=exc_info, extra={"fields": fields, "sampled": sampled}
+        )
+
+
+class RequestTimer:
+    """
+    Collects per-phase timings for one request.
+
+    Call mark(phase) at the end of each phase; the time since the previous
+    mark (or since the timer started) is stored as <phase>_ms.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.timings = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.timings[f"{phase}_ms"] = round((now - self._last) * 1000.0, 3)
+        self._last = now
+
+    def fields(self):
+        total = (time.perf_counter() - self.start) * 1000.0
+        return {**self.timings, "total_ms": round(total, 3)}
@@ -0,0 +1,96 @@
+"""
+Lat/lon proximity lookups shared by the soil API (backend/soil_server.py,
+backend/history_store.py) and projectavishkar/crop_system.py.
+
+SpatialIndex is a BallTree with the haversine metric over a fixed set of
+points (e.g. the crop.csv samples), built once. It answers k-nearest and
+within-radius queries in great-circle kilometres. It can also keep one
+tree per group (e.g. region), so "nearest sample in the same region" does
+not filter the whole table first.
+
+For data that keeps growing (the prediction history), cell_of() and
+neighbor_cells() give a fixed grid of CELL_DEG squares that a database
+can index. Every point within CELL_DEG of a location lies in its 3x3
+block of cells.
+"""
+import math
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 0.02
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; works elementwise on arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def cell_of(lat, lon):
+    """Integer key of the CELL_DEG square containing (lat, lon)."""
+    return math.floor(lat / CELL_DEG) * 100000 + math.floor(lon / CELL_DEG)
+
+
+def neighbor_cells(lat, lon):
+    """The cell of (lat, lon) and the eight around it: every cell within CELL_DEG."""
+    row, col = math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG)
+    return [(row + dr) * 100000 + (col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+
+
+class SpatialIndex:
+    def __init__(self, lat, lon, groups=None):
+        """
+        Index the points (lat[i], lon[i]). With `groups` (one label per
+        point), queries can be limited to one group. Results are positions
+        in the input arrays.
+        """
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self._tree, self._positions = self._build(np.arange(len(self.lat)))
+        self._groups = {}
+        if groups is not None:
+            groups = np.asarray(groups)
+            for group in np.unique(groups):
+                self._groups[group] = self._build(np.flatnonzero(groups == group))
+
+    def _build(self, positions):
+        points = np.radians(np.column_stack([self.lat[positions], self.lon[positions]]))
+        return BallTree(points, metric="haversine"), positions
+
+    @staticmethod
+    def _query(lat, lon):
+        points = np.column_stack([np.atleast_1d(lat), np.atleast_1d(lon)]).astype(np.float64)
+        # BallTree rejects the whole query for one NaN; name the problem instead
+        if not np.isfinite(points).all():
+            raise ValueError("latitude and longitude must be finite numbers")
+        return np.radians(points)
+
+    def _tree_for(self, group):
+        if group is None:
+            return self._tree, self._positions
+        # Unknown group: the whole set, like the old "fall back to entire dataset"
+        return self._groups.get(group, (self._tree, self._positions))
+
+    def nearest(self, lat, lon, k=1, group=None):
+        """
+        (positions, distances_km) of the k nearest points, closest first.
+        Scalar lat/lon give 1-D arrays of length k; arrays give (n, k).
+        Raises ValueError for a NaN or infinite coordinate.
+        """
+        tree, positions = self._tree_for(group)
+        query = self._query(lat, lon)
+        dist, idx = tree.query(query, k=min(k, len(positions)))
+        pos, km = positions[idx], dist * EARTH_RADIUS_KM
+        if np.ndim(lat) == 0:
+            return pos[0], km[0]
+        return pos, km
+
+    def within(self, lat, lon, radius_km, group=None):
+        """(positions, distances_km) of every point within radius_km, closest first."""
+        tree, positions = self._tree_for(group)
+        query = self._query(lat, lon)
+        idx, dist = tree.query_radius(query, r=radius_km / EARTH_RADIUS_KM, return_distance=True, sort_results=True)
+        return positions[idx[0]], dist[0] * EARTH_RADIUS_KM
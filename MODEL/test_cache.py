@@ -0,0 +1,51 @@
+"""
+Checks for the prediction cache in cache.py.
+
+Run with:  python -m pytest test_cache.py
+"""
+import time
+
+import numpy as np
+
+from cache import PredictionCache, feature_key
+
+
+def test_feature_key_is_canonical():
+    a = np.array([2023.0, 0.0, 0.0, 135.0])
+    assert feature_key(a) == feature_key(a.copy())
+    assert feature_key(a) != feature_key(a + 1)
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(max_size=2)
+    cache.put("a", 1.0)
+    cache.put("b", 2.0)
+    assert cache.get("a") == 1.0   # "a" is now most recent
+    cache.put("c", 3.0)            # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3.0
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = PredictionCache(ttl_s=0.01)
+    cache.put("a", 1.0)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidated_when_other_artifacts_are_bound():
+    model, encoder = object(), object()
+    cache = PredictionCache()
+    cache.bind(model, encoder)
+    cache.put("a", 1.0)
+    cache.bind(model, encoder)
+    assert cache.get("a") == 1.0
+
+    # A reloaded model is a new object: its answers start from empty
+    cache.bind(object(), encoder)
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
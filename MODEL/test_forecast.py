@@ -0,0 +1,39 @@
+"""
+Checks for the recursive forecaster in forecast.py.
+
+Run with:  python -m pytest test_forecast.py
+"""
+from datetime import date
+
+import numpy as np
+
+from forecast import add_months, recursive_forecast
+
+
+def test_add_months_clamps_day():
+    assert add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert add_months(date(2024, 11, 15), 3) == date(2025, 2, 15)
+
+
+def test_lag_is_rolled_forward_in_one_call_per_step():
+    calls = []
+
+    def predict_fn(records):
+        calls.append([dict(r) for r in records])
+        return [r["Water_Level_Lag1"] + 1.0 for r in records]
+
+    wells = [
+        {"WLCODE": "W1", "Date": "2024-05-01", "Season": "Summer", "Water_Level_Lag1": 10.0},
+        {"WLCODE": "W2", "Date": "2024-11-10", "Season": "Post-Monsoon", "Water_Level_Lag1": 20.0},
+    ]
+    dates, levels = recursive_forecast(predict_fn, wells, horizon=3)
+
+    assert len(calls) == 3
+    np.testing.assert_array_equal(levels, [[11, 12, 13], [21, 22, 23]])
+    assert dates[1] == ["2024-11-10", "2024-12-10", "2025-01-10"]
+    # First step is the request as sent; later seasons follow the month
+    assert calls[0][0]["Season"] == "Summer"
+    assert calls[1][0]["Season"] == "Monsoon"
+    assert calls[2][1]["Season"] == "Winter"
+    # Input records are not modified
+    assert wells[0]["Water_Level_Lag1"] == 10.0
@@ -0,0 +1,101 @@
+"""
+Checks that FlatForest reproduces sklearn forest predictions.
+
+Run with:  python -m pytest test_forest.py
+"""
+import os
+import warnings
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from forest import FlatForest, export_forest, flatten_forest, fuse_forests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "groundwater_model.pkl")
+
+
+def random_inputs(n_features, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, n_features)) * 10
+
+
+def test_groundwater_model_matches_sklearn(tmp_path):
+    """Exported groundwater forest vs. the pickled RandomForestRegressor"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = joblib.load(MODEL_PATH)
+
+    path = tmp_path / "forest.joblib"
+    export_forest(model, path)
+    flat = FlatForest.load(path)
+
+    rng = np.random.default_rng(1)
+    X = np.column_stack([
+        rng.integers(2020, 2026, 300),   # Year
+        rng.integers(-1, 3, 300),        # district
+        rng.integers(-1, 3, 300),        # WLCODE
+        rng.integers(1, 366, 300),       # day_of_year
+        rng.integers(0, 2, (300, 4)),    # one-hot columns
+    ]).astype(np.float64)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = model.predict(X)
+    np.testing.assert_allclose(flat.predict(X), expected, rtol=1e-9, atol=1e-9)
+
+
+def test_regressor_random_data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 5))
+    y = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=400)
+    model = RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y)
+
+    flat = FlatForest(flatten_forest(model))
+    X_test = random_inputs(5)
+    np.testing.assert_allclose(flat.predict(X_test), model.predict(X_test), rtol=1e-9)
+
+
+def test_multi_output_regressor():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4))
+    Y = np.column_stack([X[:, 0], X[:, 1] ** 2, X[:, 2] - X[:, 3]])
+    model = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, Y)
+
+    flat = FlatForest(flatten_forest(model))
+    X_test = random_inputs(4)
+    np.testing.assert_allclose(flat.predict(X_test), model.predict(X_test), rtol=1e-9)
+
+
+def test_classifier_proba_and_labels():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 6))
+    y = np.array(["Rice", "Wheat", "Cotton"])[(X[:, 0] > 0).astype(int) + (X[:, 1] > 1)]
+    model = RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+
+    flat = FlatForest(flatten_forest(model))
+    X_test = random_inputs(6)
+    np.testing.assert_allclose(flat.predict_proba(X_test), model.predict_proba(X_test), atol=1e-12)
+    np.testing.assert_array_equal(flat.predict(X_test), model.predict(X_test))
+
+
+def test_fused_regressors_match_each_model():
+    """Forests of different sizes fused into one (n, 3) prediction"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 4))
+    targets = [X[:, 0], X[:, 1] ** 2, X[:, 2] - X[:, 3]]
+    models = [
+        RandomForestRegressor(n_estimators=n, random_state=k).fit(X, y)
+        for k, (n, y) in enumerate(zip((5, 10, 20), targets))
+    ]
+
+    arrays = fuse_forests(models)
+    # One value per node; each tree's output column comes from tree_output
+    assert arrays["value"].shape == (len(arrays["feature"]), 1)
+    np.testing.assert_array_equal(arrays["tree_output"], np.repeat([0, 1, 2], [5, 10, 20]))
+
+    flat = FlatForest(arrays)
+    X_test = random_inputs(4)
+    expected = np.column_stack([m.predict(X_test) for m in models])
+    np.testing.assert_allclose(flat.predict(X_test), expected, rtol=1e-9)
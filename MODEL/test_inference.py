@@ -0,0 +1,71 @@
+"""
+Checks for the bounded inference pool in inference.py.
+
+Run with:  python -m pytest test_inference.py
+"""
+import asyncio
+import multiprocessing
+import threading
+
+import pytest
+
+from inference import InferenceExecutor, QueueFullError
+from model_loading import ModelRegistry
+from service_logging import get_logger
+
+registry = ModelRegistry(get_logger("test-inference"))
+release = threading.Event()
+
+
+def load():
+    # Only the test process is slow to load; a pool worker loads at once
+    if multiprocessing.parent_process() is None:
+        release.wait(30)
+    return "model"
+
+
+model = registry.add("m", load)
+
+
+def load_in_worker():
+    model.get()
+
+
+def worker_state():
+    # Loaded by the initializer before the first call
+    return model.state, model.get()
+
+
+def double(x):
+    return 2 * x
+
+
+def test_process_worker_does_not_inherit_a_held_load_lock():
+    # The preload thread is inside get(), holding the lock, when the
+    # first request starts the worker
+    registry.preload(background=True)
+    executor = InferenceExecutor(kind="process", workers=1, initializer=load_in_worker)
+    try:
+        result = asyncio.run(asyncio.wait_for(executor.run(worker_state), timeout=30))
+    except asyncio.TimeoutError:
+        # A deadlocked worker never exits on its own
+        for proc in executor._pool._processes.values():
+            proc.kill()
+        raise
+    finally:
+        release.set()
+    executor.shutdown()
+    assert result == ("loaded", "model")
+    assert executor.pending == 0
+
+
+def test_queue_full_is_rejected():
+    executor = InferenceExecutor(kind="thread", workers=1, queue_size=0)
+    executor.pending = executor.capacity
+    with pytest.raises(QueueFullError):
+        asyncio.run(executor.run(double, 2))
+    assert executor.stats()["rejected"] == 1
+
+    executor.pending = 0
+    assert asyncio.run(executor.run(double, 2)) == 4
+    executor.shutdown()
@@ -0,0 +1,106 @@
+"""
+Checks for the lazy model registry in model_loading.py.
+
+Run with:  python -m pytest test_model_loading.py
+"""
+import threading
+import time
+
+import pytest
+
+from model_loading import ModelRegistry, warmup_batch_sizes
+from service_logging import get_logger
+
+logger = get_logger("test-model-loading")
+
+
+def test_concurrent_get_loads_once():
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.05)
+        return "model"
+
+    registry = ModelRegistry(logger)
+    lazy = registry.add("m", load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(lazy.get())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["model"] * 8
+    assert len(calls) == 1
+    assert registry.ready()
+    assert "load m" in registry.phases
+
+
+def test_failed_load_is_reported_not_retried():
+    calls = []
+
+    def load():
+        calls.append(1)
+        raise FileNotFoundError("missing.pkl")
+
+    registry = ModelRegistry(logger)
+    registry.add("ok", lambda: 1)
+    lazy = registry.add("bad", load)
+
+    with pytest.raises(FileNotFoundError):
+        lazy.get()
+    assert lazy.get_or_none() is None
+    assert len(calls) == 1
+
+    registry.preload(background=False)
+    body, status = registry.readiness()
+    assert status == 503
+    assert body["models"]["ok"]["state"] == "loaded"
+    assert body["models"]["bad"]["state"] == "failed"
+    assert body["models"]["bad"]["error"] == "missing.pkl"
+
+
+def test_background_preload_and_readiness():
+    release = threading.Event()
+    registry = ModelRegistry(logger)
+    registry.add("slow", lambda: release.wait(5) and "model")
+
+    registry.preload(background=True)
+    body, status = registry.readiness()
+    assert status == 503 and not body["ready"]
+
+    release.set()
+    registry._preload_thread.join(5)
+    body, status = registry.readiness()
+    assert status == 200 and body["ready"]
+    assert list(body["startup_ms"]) == ["load slow"]
+
+
+def test_warmup_runs_each_batch_size_before_ready(monkeypatch):
+    monkeypatch.setenv("WARMUP_ROUNDS", "2")
+    monkeypatch.delenv("WARMUP_BATCH_SIZES", raising=False)
+    seen = []
+    registry = ModelRegistry(logger)
+    lazy = registry.add("m", lambda: "model", warmup=lambda m, n: seen.append((m, n)), batch_sizes=(1, 8))
+
+    assert lazy.get() == "model"
+    assert seen == [("model", 1), ("model", 1), ("model", 8), ("model", 8)]
+    assert "warmup_ms" in lazy.status()
+
+
+def test_warmup_env_overrides(monkeypatch):
+    monkeypatch.setenv("WARMUP_BATCH_SIZES", "4, 16")
+    assert warmup_batch_sizes((1,)) == [4, 16]
+    monkeypatch.setenv("WARMUP", "0")
+    assert warmup_batch_sizes((1,)) == []
+
+
+def test_failed_warmup_still_serves():
+    def warmup(model, batch_size):
+        raise RuntimeError("bad shape")
+
+    registry = ModelRegistry(logger)
+    lazy = registry.add("m", lambda: "model", warmup=warmup)
+    assert lazy.get() == "model"
+    assert registry.ready()
@@ -0,0 +1,143 @@
+"""
+Checks that the compiled FeatureEncoder matches the pandas reference
+preprocessing in preprocess.py.
+
+Run with:  python -m pytest test_preprocess.py
+"""
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from preprocess import (
+    HIGH_CARDINALITY_COLS,
+    UNKNOWN_CODE,
+    FeatureEncoder,
+    build_vocabularies,
+    preprocess_new_data,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, "final_merged_dataset.csv")
+TRAINING_COLUMNS_PATH = os.path.join(BASE_DIR, "training_columns.pkl")
+VOCAB_PATH = os.path.join(BASE_DIR, "category_vocab.pkl")
+
+
+def load_dataset():
+    return pd.read_csv(DATASET_PATH)
+
+
+def load_training_frame():
+    """Dataset in the order train_model.py factorizes it"""
+    df = load_dataset()
+    df["Date"] = pd.to_datetime(df["Date"], format="%d-%m-%Y", errors="coerce")
+    df.sort_values(by=["WLCODE", "Date"], inplace=True)
+    return df
+
+
+def reference_features(raw_df, training_columns, vocabularies=None):
+    with warnings.catch_warnings():
+        # The dataset uses DD-MM-YYYY, which pandas warns about
+        warnings.simplefilter("ignore", UserWarning)
+        X = preprocess_new_data(raw_df, training_columns, vocabularies)
+        return X.to_numpy(dtype=np.float64)
+
+
+def test_encoder_matches_pandas_on_dataset():
+    """Whole dataset: pandas frame path vs. encoder row by row"""
+    df = load_dataset()
+    training_columns = joblib.load(TRAINING_COLUMNS_PATH)
+
+    # The frame path factorizes in order of appearance; give the encoder
+    # the same codes so only the encoding machinery is compared.
+    vocabularies = build_vocabularies(df)
+    encoder = FeatureEncoder(training_columns, vocabularies)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        X_enc = encoder.encode_many(df.to_dict("records"))
+    X_ref = reference_features(df, training_columns)
+
+    assert X_enc.shape == X_ref.shape
+    np.testing.assert_allclose(X_enc, X_ref)
+
+
+def test_encoder_matches_pandas_for_single_request():
+    """One ISO-dated request using the baseline (dropped) categories"""
+    training_columns = joblib.load(TRAINING_COLUMNS_PATH)
+    vocabularies = joblib.load(VOCAB_PATH)
+    encoder = FeatureEncoder(training_columns, vocabularies)
+
+    raw = {
+        "state": "Maharashtra",
+        "SITE_TYPE": "Borewell",
+        "Season": "Monsoon",
+        "district": "Thane",
+        "WLCODE": "W1",
+        "Year": 2024,
+        "Date": "2024-05-01",
+        "Water_Level_Lag1": 22.8,
+    }
+    X_enc = encoder.encode(raw)
+    X_ref = reference_features(pd.DataFrame([raw]), training_columns, vocabularies)
+
+    np.testing.assert_allclose(X_enc, X_ref)
+
+
+def test_encoder_sets_training_dummy_slots():
+    """Dummies land in the fixed training slots even for a single row"""
+    training_columns = joblib.load(TRAINING_COLUMNS_PATH)
+    encoder = FeatureEncoder(training_columns)
+
+    row = encoder.encode({"Date": "2023-03-15", "SITE_TYPE": "Observation", "Season": "Summer"})[0]
+    features = dict(zip(training_columns, row))
+
+    assert features["SITE_TYPE_Observation"] == 1.0
+    assert features["Season_Summer"] == 1.0
+    assert features["Season_Winter"] == 0.0
+    assert features["day_of_year"] == 74
+
+
+def test_saved_vocabularies_match_training_codes():
+    """category_vocab.pkl reproduces the codes train_model.py trains on"""
+    df = load_training_frame()
+    vocabularies = joblib.load(VOCAB_PATH)
+    training_columns = joblib.load(TRAINING_COLUMNS_PATH)
+    encoder = FeatureEncoder(training_columns, vocabularies)
+
+    records = df.assign(Date=df["Date"].dt.strftime("%Y-%m-%d")).to_dict("records")
+    X_enc = encoder.encode_many(records)
+
+    for col in HIGH_CARDINALITY_COLS:
+        train_codes = pd.factorize(df[col])[0]
+        serve_codes = X_enc[:, training_columns.index(col)]
+        np.testing.assert_array_equal(serve_codes, train_codes)
+
+        # Serving one row at a time must not collapse codes to 0
+        for value, code in vocabularies[col].items():
+            row = encoder.encode({col: value, "Date": "2024-01-01"})[0]
+            assert row[training_columns.index(col)] == code
+
+
+def test_unknown_category_bucket():
+    """Unseen district/WLCODE values map to UNKNOWN_CODE in both paths"""
+    training_columns = joblib.load(TRAINING_COLUMNS_PATH)
+    vocabularies = {"district": {"Thane": 0, "Pune": 1}, "WLCODE": {"W1": 0}}
+    encoder = FeatureEncoder(training_columns, vocabularies)
+
+    raw = {
+        "state": "Maharashtra",
+        "SITE_TYPE": "Borewell",
+        "Season": "Monsoon",
+        "district": "Pune",
+        "WLCODE": "W999",
+        "Date": "2024-05-01",
+    }
+    row = dict(zip(training_columns, encoder.encode(raw)[0]))
+    assert row["district"] == 1
+    assert row["WLCODE"] == UNKNOWN_CODE
+
+    X_ref = reference_features(pd.DataFrame([raw]), training_columns, vocabularies)
+    np.testing.assert_allclose(encoder.encode(raw), X_ref)
@@ -0,0 +1,74 @@
+"""
+Checks that spatial_index.py agrees with brute-force haversine distances.
+
+Run with:  python -m pytest test_spatial_index.py
+"""
+import numpy as np
+import pytest
+
+from spatial_index import CELL_DEG, SpatialIndex, cell_of, haversine_km, neighbor_cells
+
+
+def random_points(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(16.0, 22.0, n), rng.uniform(72.5, 81.0, n)
+
+
+def test_haversine_known_distance():
+    # Mumbai to Pune, roughly 120 km
+    assert 115 < haversine_km(19.076, 72.8777, 18.5204, 73.8567) < 125
+
+
+def test_nearest_matches_brute_force():
+    lat, lon = random_points()
+    index = SpatialIndex(lat, lon)
+    pos, km = index.nearest(19.0, 75.0, k=5)
+
+    brute = haversine_km(19.0, 75.0, lat, lon)
+    np.testing.assert_array_equal(pos, np.argsort(brute)[:5])
+    np.testing.assert_allclose(km, np.sort(brute)[:5], rtol=1e-9)
+
+
+def test_batch_nearest_and_groups():
+    lat, lon = random_points()
+    groups = np.where(lat > 19.0, "north", "south")
+    index = SpatialIndex(lat, lon, groups=groups)
+
+    pos, _ = index.nearest(np.array([17.0, 21.0]), np.array([74.0, 78.0]), k=3)
+    assert pos.shape == (2, 3)
+
+    pos, _ = index.nearest(21.0, 78.0, k=10, group="south")
+    assert (groups[pos] == "south").all()
+    # Unknown group searches everything
+    pos_any, _ = index.nearest(21.0, 78.0, k=1, group="west")
+    assert pos_any[0] == index.nearest(21.0, 78.0)[0][0]
+
+
+def test_within_radius():
+    lat, lon = random_points()
+    index = SpatialIndex(lat, lon)
+    pos, km = index.within(19.0, 75.0, radius_km=50)
+
+    brute = haversine_km(19.0, 75.0, lat, lon)
+    assert set(pos) == set(np.flatnonzero(brute <= 50))
+    assert (np.diff(km) >= 0).all()
+
+
+def test_neighbor_cells_cover_tolerance():
+    lat, lon = 21.3, 77.56
+    cells = set(neighbor_cells(lat, lon))
+    for dlat in (-CELL_DEG, 0, CELL_DEG):
+        for dlon in (-CELL_DEG, 0, CELL_DEG):
+            assert cell_of(lat + dlat * 0.999, lon + dlon * 0.999) in cells
+
+
+@pytest.mark.parametrize("bad", [np.nan, np.inf, -np.inf])
+def test_non_finite_coordinates_are_rejected(bad):
+    lat, lon = random_points()
+    index = SpatialIndex(lat, lon)
+    with pytest.raises(ValueError, match="finite"):
+        index.nearest(bad, 75.0)
+    with pytest.raises(ValueError, match="finite"):
+        index.nearest(np.array([19.0, 20.0]), np.array([75.0, bad]), k=3)
+    with pytest.raises(ValueError, match="finite"):
+        index.within(19.0, bad, radius_km=50)
@@ -6,6 +6,9 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import joblib
 import math
 
+from forest import export_forest
+from preprocess import build_vocabularies
+
 df = pd.read_csv("final_merged_dataset.csv")
 
 # CLEANING
@@ -26,6 +29,11 @@ df.fillna(df.median(numeric_only=True), inplace=True)
 
 df["day_of_year"] = df["Date"].dt.dayofyear
 df = pd.get_dummies(df, columns=["state", "SITE_TYPE", "Season"], drop_first=True)
+
+# Persist the factorize vocabularies so serving encodes with the same codes
+vocabularies = build_vocabularies(df)
+joblib.dump(vocabularies, "category_vocab.pkl")
+
 df["district"] = pd.factorize(df["district"])[0]
 df["WLCODE"] = pd.factorize(df["WLCODE"])[0]
 df.drop("Date", axis=1, inplace=True)
@@ -55,4 +63,8 @@ print("RMSE:", rmse)
 print("R²:", r2)
 
 joblib.dump(model, "groundwater_model.pkl")
-print("\nSaved groundwater_model.pkl and training_columns.pkl")
+print("\nSaved groundwater_model.pkl, training_columns.pkl and category_vocab.pkl")
+
+# Flattened copy for MODEL_BACKEND=flat in api.py
+export_forest(model, "groundwater_forest.joblib")
+print("Saved groundwater_forest.joblib")
@@ -0,0 +1,281 @@
+"""
+Throughput benchmarks for the disease-detection server.
+
+Usage:
+    python benchmark.py batching     # images/sec through the batch worker at batch 1, 8, 32
+    python benchmark.py backends     # per-call latency of each inference backend
+    python benchmark.py runtimes     # startup, RSS and latency of server.py per DISEASE_BACKEND
+                                     # (tflite needs model/plant_disease_model.tflite)
+    python benchmark.py preprocess   # decode+resize+normalize of large JPEGs, old path vs ImagePreprocessor
+    python benchmark.py services     # uploads/sec and latency, Flask server.py vs ASGI disease_api.py
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+from image_preprocessing import ImagePreprocessor  # noqa: E402
+from inference_worker import BatchInferenceWorker  # noqa: E402
+
+
+def sample_images(n, size=256, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.random((size, size, 3), dtype=np.float32) for _ in range(n)]
+
+
+def drive(worker, clients, images_per_client):
+    """`clients` threads each push images one at a time, like separate uploads."""
+    images = sample_images(8)
+
+    def client():
+        for i in range(images_per_client):
+            worker.submit(images[i % len(images)]).result()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return clients * images_per_client / (time.perf_counter() - start)
+
+
+def bench_batching(total_images, timeout_ms):
+    import server
+
+    runner = server.disease.get().runner
+    for batch_size in (1, 8, 32):
+        worker = BatchInferenceWorker(runner, batch_size, timeout_ms / 1000.0)
+        worker.predict(sample_images(batch_size))  # warm-up for this shape
+
+        clients = batch_size * 2
+        per_client = max(1, total_images // clients)
+        rate = drive(worker, clients, per_client)
+        stats = worker.stats()
+        print(f"batch {batch_size:3d}: {rate:7.1f} images/s "
+              f"({clients} clients, avg batch {stats['avg_batch_size']})")
+
+
+def bench_backends(repeats):
+    from tensorflow.keras.models import load_model
+
+    from model_runtime import RUNNERS
+
+    model = load_model(os.path.join("model", "plant_disease_model.h5"))
+    for name, cls in RUNNERS.items():
+        runner = cls(model)
+        for batch_size in (1, 8):
+            batch = np.stack(sample_images(batch_size))
+            runner(batch)  # warm-up
+            lat = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                runner(batch)
+                lat.append((time.perf_counter() - start) * 1000.0)
+            print(f"{name:10s} batch {batch_size}: p50 {np.percentile(lat, 50):7.2f} ms  "
+                  f"p99 {np.percentile(lat, 99):7.2f} ms")
+
+
+def measure_runtime(repeats):
+    """Import server.py with the current DISEASE_BACKEND; runs in a child process."""
+    start = time.perf_counter()
+    import server
+
+    classifier = server.disease.get()  # waits for the background preload
+    startup_s = time.perf_counter() - start
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    batch = np.stack(sample_images(1))
+    classifier.runner(batch)
+    lat = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        classifier.runner(batch)
+        lat.append((time.perf_counter() - t) * 1000.0)
+    return {
+        "backend": classifier.runner.name,
+        "startup_s": startup_s,
+        "rss_mb": rss_mb,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+    }
+
+
+def bench_runtimes(repeats, backends):
+    for backend in backends:
+        env = {**os.environ, "DISEASE_BACKEND": backend, "DISEASE_BATCHING": "0"}
+        proc = subprocess.run(
+            [sys.executable, __file__, "_runtime", "-r", str(repeats)],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0:
+            print(f"{backend:10s} failed: {proc.stderr.strip().splitlines()[-1]}")
+            continue
+        res = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{res['backend']:10s} startup {res['startup_s']:6.2f} s  RSS {res['rss_mb']:7.1f} MB  "
+              f"batch 1: p50 {res['p50_ms']:7.2f} ms  p99 {res['p99_ms']:7.2f} ms")
+
+
+def sample_jpeg(width, height, seed=0):
+    """Phone-photo-sized JPEG: smooth gradients plus noise, so it compresses like a real one."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(base + rng.integers(-20, 20, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def legacy_preprocess(data, size):
+    """The pre-ImagePreprocessor path: full decode, resize, float64 /255, cast."""
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data)).convert("RGB").resize(size)
+    return (np.array(img) / 255.0).astype(np.float32)
+
+
+def bench_preprocess(repeats, sizes, input_size):
+    preprocessor = ImagePreprocessor((None, input_size, input_size, 3))
+    out = np.empty(preprocessor.shape, dtype=np.float32)
+    for width, height in sizes:
+        data = sample_jpeg(width, height)
+        paths = {
+            "legacy": lambda: legacy_preprocess(data, preprocessor.size),
+            "draft+float32": lambda: preprocessor.preprocess(data, out=out),
+        }
+        results = {}
+        for name, fn in paths.items():
+            fn()  # warm-up
+            lat = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn()
+                lat.append((time.perf_counter() - start) * 1000.0)
+            results[name] = float(np.percentile(lat, 50))
+            print(f"{width}x{height} ({len(data) / 1e6:.1f} MB) {name:14s}: "
+                  f"p50 {results[name]:7.2f} ms  p99 {np.percentile(lat, 99):7.2f} ms")
+        diff = np.abs(legacy_preprocess(data, preprocessor.size) - preprocessor.preprocess(data)).mean()
+        print(f"{'':24s}speed-up {results['legacy'] / results['draft+float32']:.1f}x, "
+              f"mean abs pixel diff {diff:.4f}")
+
+
+SERVICES = {
+    # Flask's dev server as server.py runs it (threaded, no reloader here)
+    "flask": "import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    "asgi": "import uvicorn, disease_api; uvicorn.run(disease_api.app, host='127.0.0.1', port={port}, "
+            "log_level='warning')",
+}
+
+
+def start_service(name, port):
+    import requests
+
+    env = {**os.environ, "DISEASE_CACHE": "0", "LOG_SAMPLE_RATE": "0"}
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVICES[name].format(port=port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/model-info", timeout=1).ok:
+                return proc
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"{name} did not start on port {port}")
+
+
+def drive_uploads(url, uploads, clients, per_client):
+    """`clients` threads each POST uploads one at a time; returns (req/s, latencies ms, errors)."""
+    import requests
+
+    lat = []
+    errors = []
+
+    def client(offset):
+        with requests.Session() as session:
+            for i in range(per_client):
+                data = uploads[(offset + i) % len(uploads)]
+                start = time.perf_counter()
+                r = session.post(url, files={"file": ("leaf.jpg", data, "image/jpeg")})
+                lat.append((time.perf_counter() - start) * 1000.0)
+                if r.status_code != 200:
+                    errors.append(r.status_code)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return clients * per_client / (time.perf_counter() - start), lat, errors
+
+
+def bench_services(requests_per_client, concurrency, width, height):
+    # Distinct photos so nothing could be answered from a cache
+    uploads = [sample_jpeg(width, height, seed) for seed in range(8)]
+    for port, name in enumerate(SERVICES, start=5100):
+        proc = start_service(name, port)
+        try:
+            url = f"http://127.0.0.1:{port}/predict"
+            drive_uploads(url, uploads, 1, 2)  # warm-up
+            for clients in concurrency:
+                rate, lat, errors = drive_uploads(url, uploads, clients, requests_per_client)
+                print(f"{name:6s} {clients:3d} clients: {rate:6.1f} req/s  p50 {np.percentile(lat, 50):7.1f} ms  "
+                      f"p99 {np.percentile(lat, 99):7.1f} ms  errors {len(errors)}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    batching = sub.add_parser("batching")
+    batching.add_argument("-n", "--images", type=int, default=256)
+    batching.add_argument("--timeout-ms", type=float, default=5.0)
+    backends = sub.add_parser("backends")
+    backends.add_argument("-r", "--repeats", type=int, default=30)
+    for name in ("runtimes", "_runtime"):
+        runtimes = sub.add_parser(name)
+        runtimes.add_argument("-r", "--repeats", type=int, default=30)
+        runtimes.add_argument("--backends", nargs="+", default=["keras", "function", "tflite"])
+    preprocess = sub.add_parser("preprocess")
+    preprocess.add_argument("-r", "--repeats", type=int, default=20)
+    preprocess.add_argument("--input-size", type=int, default=256)
+    services = sub.add_parser("services")
+    services.add_argument("-r", "--requests", type=int, default=20, help="per client")
+    services.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    services.add_argument("--size", type=int, nargs=2, default=[1920, 1080], metavar=("W", "H"))
+    args = parser.parse_args()
+
+    if args.cmd == "batching":
+        bench_batching(args.images, args.timeout_ms)
+    elif args.cmd == "backends":
+        bench_backends(args.repeats)
+    elif args.cmd == "runtimes":
+        bench_runtimes(args.repeats, args.backends)
+    elif args.cmd == "preprocess":
+        bench_preprocess(args.repeats, [(4032, 3024), (1920, 1080), (640, 480)], args.input_size)
+    elif args.cmd == "services":
+        bench_services(args.requests, args.concurrency, *args.size)
+    elif args.cmd == "_runtime":
+        print(json.dumps(measure_runtime(args.repeats)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Async plant-disease API: one ASGI service for what server.py (Flask,
+/predict) and model/app.py (FastAPI, /analyze-image) used to serve
+separately.
+
+Run with:  uvicorn disease_api:app --host 0.0.0.0 --port 5000
+
+Uploads are read in chunks from Starlette's spooled multipart parts. The
+size cap (413) limits what is read into memory, not what is received:
+Starlette has spooled the whole body by the time it applies. Decode +
+inference run in a bounded thread pool, so a slow upload or a busy model
+never blocks the event loop. When the pool is saturated the endpoints
+answer 503 with Retry-After instead of queueing without limit. Labels
+and the input size come from the model metadata (see disease_model.py).
+
+Config: DISEASE_WORKERS, DISEASE_QUEUE_SIZE, DISEASE_MAX_UPLOAD_MB plus
+everything DiseaseClassifier.from_env reads.
+"""
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import logging
+import os
+import sys
+
+# Shared logging and the bounded executor live next to the groundwater model
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MODEL"))
+from inference import InferenceExecutor, QueueFullError
+from model_loading import ModelRegistry
+from service_logging import RequestTimer, get_logger, log_event
+from disease_model import expected_batch_sizes, load_classifier
+
+logger = get_logger("disease-api")
+
+# More threads than cores: PIL decode releases the GIL, and concurrent
+# uploads are what lets the batch worker build batches larger than one
+executor = InferenceExecutor(
+    kind="thread",
+    workers=int(os.environ.get("DISEASE_WORKERS", "4")),
+    queue_size=int(os.environ.get("DISEASE_QUEUE_SIZE", "32")),
+)
+RETRY_AFTER_S = os.environ.get("INFERENCE_RETRY_AFTER", "1")
+MAX_UPLOAD_BYTES = int(float(os.environ.get("DISEASE_MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Loaded on first use or by a background preload (MODEL_PRELOAD); /readyz
+# answers 503 until it is
+models = ModelRegistry(logger)
+disease = models.add(
+    "disease",
+    lambda: load_classifier(logger, models),
+    warmup=lambda classifier, batch_size: classifier.warmup(batch_size),
+    batch_sizes=expected_batch_sizes(),
+)
+models.preload_from_env()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class PredictionResponse(BaseModel):
+    prediction: str
+    confidence: float              # percent, as server.py returned it
+
+
+class BatchPredictionItem(BaseModel):
+    filename: Optional[str] = None
+    prediction: Optional[str] = None
+    confidence: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    predictions: List[BatchPredictionItem]
+
+
+class DiseaseResult(BaseModel):
+    disease: str
+    severity: str
+    confidence: float              # 0-1 fraction, as model/app.py returned it
+    causes: List[str]
+    remedies: List[str]
+
+
+def error(status, message):
+    """server.py's {"error": ...} body, so existing clients keep working."""
+    return JSONResponse({"error": message}, status_code=status)
+
+
+async def read_upload(file: UploadFile):
+    chunks = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{file.filename} is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB",
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def run_on_executor(fn, *args):
+    try:
+        return await executor.run(fn, *args)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": RETRY_AFTER_S}
+        )
+
+
+def classify(data, timer):
+    timer.mark("queue")
+    return disease.get().classify(data, timer)
+
+
+def classify_many(uploads, timer):
+    timer.mark("queue")
+    return disease.get().classify_many(uploads, timer)
+
+
+async def classify_upload(file, path):
+    timer = RequestTimer()
+    data = await read_upload(file)
+    timer.mark("upload")
+    result, source, scores = await run_on_executor(classify, data, timer)
+    fields = {"cache": source} if source else {"scores": [round(float(p), 4) for p in scores]}
+    log_event(logger, "request", sampled=True, path=path, **result, **fields, **timer.fields())
+    return result
+
+
+@app.get("/healthz")
+def healthz():
+    return models.health()
+
+
+@app.get("/readyz")
+def readyz():
+    body, status = models.readiness()
+    return JSONResponse(body, status_code=status)
+
+
+@app.get("/")
+def home():
+    return {
+        "message": "Plant Disease Detection API is running!",
+        "model_loaded": disease.loaded,
+        "endpoints": {
+            "GET /": "API status",
+            "GET /healthz": "Process is up",
+            "GET /readyz": "Model loaded (503 until then)",
+            "GET /model-info": "Model information",
+            "POST /predict": "Disease prediction",
+            "POST /predict/batch": "Disease prediction for several files",
+            "POST /analyze-image": "Disease, severity, causes and remedies"
+        }
+    }
+
+
+@app.get("/model-info")
+def model_info():
+    classifier = disease.get_or_none()
+    if classifier is None:
+        return error(500, "Model not loaded")
+    return {**classifier.info(), "executor": executor.stats()}
+
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict(file: Optional[UploadFile] = File(None)):
+    # Never load on the event loop: a pending model is loaded by the
+    # executor thread that first needs it
+    if disease.error is not None:
+        return error(500, "Model not loaded. Please check server logs.")
+    # Optional, so a missing file is server.py's 400 rather than a 422
+    if file is None:
+        return error(400, "No file uploaded")
+    if not file.filename:
+        return error(400, "No file selected")
+    try:
+        return await classify_upload(file, "/predict")
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_event(logger, "prediction error", level=logging.ERROR, exc_info=True)
+        return error(500, f"Prediction failed: {str(e)}")
+
+
+@app.post("/predict/batch", response_model=BatchPredictionResponse, response_model_exclude_none=True)
+async def predict_batch(files: Optional[List[UploadFile]] = File(None)):
+    """
+    Multi-file upload (form field "files", repeated); same contract as
+    server.py: one result per file in order, undecodable files get an
+    "error" entry.
+    """
+    if disease.error is not None:
+        return error(500, "Model not loaded. Please check server logs.")
+    # Optional, so no files is server.py's 400 rather than a 422
+    if not files:
+        return error(400, "No files uploaded")
+
+    timer = RequestTimer()
+    uploads = [await read_upload(file) for file in files]
+    timer.mark("upload")
+    try:
+        results = await run_on_executor(classify_many, uploads, timer)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_event(logger, "batch prediction error", level=logging.ERROR, exc_info=True)
+        return error(500, f"Prediction failed: {str(e)}")
+
+    log_event(logger, "request", sampled=True, path="/predict/batch", files=len(files), **timer.fields())
+    return {"predictions": [{"filename": f.filename, **r} for f, r in zip(files, results)]}
+
+
+@app.post("/analyze-image", response_model=DiseaseResult)
+async def analyze_image(file: UploadFile = File(...)):
+    if disease.error is not None:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+    try:
+        result = await classify_upload(file, "/analyze-image")
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_event(logger, "prediction error", level=logging.ERROR, exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
+    return disease.get().describe(result)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("DISEASE_PORT", "5000")))
@@ -0,0 +1,312 @@
+"""
+Plant-disease classifier shared by server.py (Flask) and disease_api.py (ASGI).
+
+DiseaseClassifier owns everything between the uploaded bytes and the
+answer: the upload cache, decode/resize (sized from the model's
+input_shape), the inference runner and optional batch worker, and the
+labels read from the model's metadata file (model/plant_disease_model.json)
+rather than a list hardcoded in each server.
+
+Configuration comes from the same environment variables as before:
+MODEL_PATH, TFLITE_MODEL_PATH, DISEASE_METADATA_PATH, DISEASE_BACKEND,
+DISEASE_BATCHING / _MAX_BATCH / _BATCH_TIMEOUT_MS and DISEASE_CACHE*.
+"""
+import io
+import json
+import logging
+import os
+from contextlib import nullcontext
+
+import numpy as np
+from PIL import Image
+
+from image_preprocessing import ImagePreprocessor
+from inference_worker import BatchInferenceWorker
+from model_runtime import KerasRunner, TFLiteRunner, build_runner
+from service_logging import log_event
+from upload_cache import UploadCache, content_key
+
+# Defaults resolve next to this file so either server runs from any cwd
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+MODEL_PATH = os.environ.get("MODEL_PATH", os.path.join(MODEL_DIR, "plant_disease_model.h5"))
+TFLITE_PATH = os.environ.get(
+    "TFLITE_MODEL_PATH", os.path.join(MODEL_DIR, "plant_disease_model.tflite")
+)
+METADATA_PATH = os.environ.get(
+    "DISEASE_METADATA_PATH", os.path.join(MODEL_DIR, "plant_disease_model.json")
+)
+
+
+def load_metadata(path, num_classes):
+    """Labels (in output order) and per-label /analyze-image details."""
+    try:
+        with open(path) as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        metadata = {}
+    labels = metadata.get("labels") or [f"class_{i}" for i in range(num_classes)]
+    if len(labels) != num_classes:
+        raise ValueError(
+            f"{path} lists {len(labels)} labels but the model has {num_classes} outputs"
+        )
+    return labels, metadata.get("analysis", {})
+
+
+def load_runner(backend, logger, timed=lambda phase: nullcontext()):
+    """
+    "function" (traced tf.function, default), "keras" (model.predict) or
+    "tflite" (interpreter over the file from export_tflite.py; the Keras
+    model and full TensorFlow are not loaded at all)
+    """
+    if backend == "tflite":
+        return TFLiteRunner(TFLITE_PATH)
+
+    with timed("import tensorflow"):
+        from tensorflow.keras.models import load_model
+
+    with timed("load keras model"):
+        model = load_model(MODEL_PATH)
+    try:
+        # Includes tracing the tf.function for the "function" backend
+        with timed(f"build {backend} runner"):
+            return build_runner(model, backend)
+    except Exception:
+        log_event(
+            logger,
+            "inference backend failed, falling back to keras",
+            level=logging.WARNING,
+            backend=backend,
+            exc_info=True,
+        )
+        return KerasRunner(model)
+
+
+def cache_from_env(model_path):
+    """
+    Repeated uploads are answered from a cache keyed on the file bytes
+    (DISEASE_CACHE=0 to disable). DISEASE_CACHE_DB adds a SQLite disk tier;
+    DISEASE_CACHE_PHASH=1 also matches near-duplicates by perceptual hash.
+    """
+    if os.environ.get("DISEASE_CACHE", "1") == "0":
+        return None
+    return UploadCache(
+        model_path,
+        max_size=int(os.environ.get("DISEASE_CACHE_SIZE", "1000")),
+        ttl_s=float(os.environ.get("DISEASE_CACHE_TTL_S", "86400")),
+        disk_path=os.environ.get("DISEASE_CACHE_DB") or None,
+        disk_max_entries=int(os.environ.get("DISEASE_CACHE_DISK_MAX", "100000")),
+        phash=os.environ.get("DISEASE_CACHE_PHASH", "0") == "1",
+        phash_distance=int(os.environ.get("DISEASE_CACHE_PHASH_DISTANCE", "4")),
+    )
+
+
+def load_classifier(logger, registry):
+    """Loader for ModelRegistry.add: build from env and log what was loaded."""
+    classifier = DiseaseClassifier.from_env(logger, registry.timed)
+    runner = classifier.runner
+    log_event(
+        logger,
+        "model loaded",
+        backend=runner.name,
+        input_shape=str(runner.input_shape),
+        output_shape=str(runner.output_shape),
+        num_classes=len(classifier.labels),
+    )
+    return classifier
+
+
+def prediction_body(result):
+    """
+    The /predict fields of a classify() result, as server.py always
+    returned them; the raw "probability" stays server-side.
+    """
+    return {k: v for k, v in result.items() if k != "probability"}
+
+
+def expected_batch_sizes():
+    """
+    Batch shapes the runner will see: 1 without the batch worker, else
+    powers of two up to DISEASE_MAX_BATCH (and the max itself).
+    """
+    if os.environ.get("DISEASE_BATCHING", "1") == "0":
+        return (1,)
+    max_batch = int(os.environ.get("DISEASE_MAX_BATCH", "16"))
+    sizes = [1]
+    while sizes[-1] * 2 < max_batch:
+        sizes.append(sizes[-1] * 2)
+    if max_batch > 1:
+        sizes.append(max_batch)
+    return tuple(sizes)
+
+
+class DiseaseClassifier:
+    def __init__(self, runner, labels, analysis=None, worker=None, cache=None):
+        self.runner = runner
+        self.labels = labels
+        self.analysis = analysis or {}
+        self.worker = worker
+        self.cache = cache
+        # Decode/resize target comes from the loaded model, not a hardcoded size
+        self.preprocessor = ImagePreprocessor(runner.input_shape)
+
+    @classmethod
+    def from_env(cls, logger, timed=lambda phase: nullcontext()):
+        """timed: ModelRegistry.timed, to break the load down into startup phases"""
+        backend = os.environ.get("DISEASE_BACKEND", "function")
+        runner = load_runner(backend, logger, timed)
+        labels, analysis = load_metadata(METADATA_PATH, int(runner.output_shape[-1]))
+
+        # Concurrent uploads are stacked into one forward pass by a background
+        # worker (DISEASE_BATCHING=0 runs the model per request instead)
+        worker = None
+        if os.environ.get("DISEASE_BATCHING", "1") != "0":
+            worker = BatchInferenceWorker(
+                runner,
+                int(os.environ.get("DISEASE_MAX_BATCH", "16")),
+                float(os.environ.get("DISEASE_BATCH_TIMEOUT_MS", "5")) / 1000.0,
+            )
+        cache = cache_from_env(TFLITE_PATH if runner.name == "tflite" else MODEL_PATH)
+        return cls(runner, labels, analysis, worker, cache)
+
+    def predict_arrays(self, arrays):
+        """Run (H, W, 3) float32 arrays (a list or a stacked batch) through the model, batched if enabled."""
+        if self.worker is not None:
+            return self.worker.predict(arrays)
+        if isinstance(arrays, np.ndarray):
+            return self.runner(arrays)
+        return self.runner(np.stack(arrays))
+
+    def format_prediction(self, scores):
+        predicted_index = int(np.argmax(scores))
+        confidence = float(np.max(scores) * 100)
+
+        # Ensure valid index range
+        predicted_class = self.labels[predicted_index] if predicted_index < len(self.labels) else "Unknown"
+        return {
+            "prediction": predicted_class,
+            "confidence": round(confidence, 2),
+            # Unrounded, for /analyze-image's 0-1 confidence
+            "probability": float(np.max(scores)),
+        }
+
+    def describe(self, result):
+        """/analyze-image shape for a /predict result (confidence as a 0-1 fraction)."""
+        details = {**self.analysis.get("default", {}), **self.analysis.get(result["prediction"], {})}
+        return {
+            "disease": result["prediction"],
+            "severity": details.get("severity", "Unknown"),
+            # Results cached before "probability" was stored only have the percent
+            "confidence": result.get("probability", result["confidence"] / 100.0),
+            "causes": details.get("causes", []),
+            "remedies": details.get("remedies", []),
+        }
+
+    def classify(self, data, timer=None):
+        """
+        Upload bytes -> (result, cache_source, scores). cache_source is None
+        and scores is the model output when the model actually ran.
+        """
+        key = content_key(data) if self.cache is not None else None
+        if key is not None:
+            # Same bytes as an earlier upload: no decode, no model
+            cached, source = self.cache.lookup(key)
+            if cached is not None:
+                self.cache.record(source)
+                return cached, source, None
+
+        img = self.preprocessor.decode(data)
+        _mark(timer, "decode")
+
+        phash = None
+        if self.cache is not None:
+            cached, source, phash = self.cache.lookup_similar(img)
+            if cached is not None:
+                self.cache.record(source)
+                return cached, source, None
+
+        img_array = self.preprocessor.to_array(img)
+        _mark(timer, "preprocess")
+
+        # Shares a forward pass with concurrent uploads
+        scores = self.predict_arrays([img_array])[0]
+        _mark(timer, "inference")
+
+        result = self.format_prediction(scores)
+        if self.cache is not None:
+            self.cache.put(key, result, phash)
+            self.cache.record(None)
+        return result, None, scores
+
+    def classify_many(self, uploads, timer=None):
+        """
+        Several uploads in one forward pass. Returns one result dict per
+        upload, in order; an upload that cannot be decoded gets
+        {"error": ...} instead of failing the others.
+        """
+        results = [None] * len(uploads)
+        # Each image is normalized straight into its row of one float32 batch
+        batch = self.preprocessor.empty_batch(len(uploads))
+        valid_idx = []
+        cache_keys = []
+        for i, data in enumerate(uploads):
+            try:
+                key, phash = None, None
+                if self.cache is not None:
+                    key = content_key(data)
+                    cached, source = self.cache.lookup(key)
+                    if cached is None:
+                        img = self.preprocessor.decode(data)
+                        cached, source, phash = self.cache.lookup_similar(img)
+                    if cached is not None:
+                        self.cache.record(source)
+                        results[i] = dict(cached)
+                        continue
+                    self.preprocessor.to_array(img, out=batch[len(valid_idx)])
+                else:
+                    self.preprocessor.preprocess(data, out=batch[len(valid_idx)])
+                valid_idx.append(i)
+                cache_keys.append((key, phash))
+            except Exception as e:
+                results[i] = {"error": f"Could not read image: {e}"}
+        _mark(timer, "preprocess")
+
+        if valid_idx:
+            scores = self.predict_arrays(batch[:len(valid_idx)])
+            for i, (key, phash), row in zip(valid_idx, cache_keys, scores):
+                result = self.format_prediction(row)
+                if self.cache is not None:
+                    self.cache.put(key, result, phash)
+                    self.cache.record(None)
+                results[i] = result
+        _mark(timer, "inference")
+        return results
+
+    def warmup(self, batch_size):
+        """
+        One synthetic JPEG through the decoder and a batch of `batch_size`
+        straight through the runner, bypassing the cache and the worker.
+        """
+        width, height = self.preprocessor.size
+        buf = io.BytesIO()
+        Image.new("RGB", (width * 2, height * 2), (90, 140, 60)).save(buf, format="JPEG")
+        batch = self.preprocessor.empty_batch(batch_size)
+        for row in batch:
+            self.preprocessor.preprocess(buf.getvalue(), out=row)
+        self.runner(batch)
+
+    def info(self):
+        return {
+            "model_loaded": True,
+            "input_shape": str(self.runner.input_shape),
+            "output_shape": str(self.runner.output_shape),
+            "classes": self.labels,
+            "num_classes": len(self.labels),
+            "backend": self.runner.name,
+            "batching": self.worker.stats() if self.worker is not None else None,
+            "cache": self.cache.stats() if self.cache is not None else None
+        }
+
+
+def _mark(timer, phase):
+    if timer is not None:
+        timer.mark(phase)
@@ -0,0 +1,115 @@
+"""
+Export plant_disease_model.h5 to TensorFlow Lite for CPU serving.
+
+Usage:
+    python export_tflite.py                                # float32
+    python export_tflite.py --quantize dynamic             # int8 weights
+    python export_tflite.py --quantize int8 --calibration-dir samples/
+
+--quantize int8 calibrates activation ranges on the images in
+--calibration-dir (jpg/png). The input and output stay float32, so
+server.py can switch with DISEASE_BACKEND=tflite and no other change.
+
+After exporting, an accuracy-delta report compares the TFLite model to
+the Keras model on --eval-dir (falls back to the calibration images,
+then to random inputs): top-1 agreement and probability differences.
+"""
+import argparse
+import glob
+import os
+
+import numpy as np
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import tensorflow as tf  # noqa: E402
+
+from image_preprocessing import ImagePreprocessor  # noqa: E402
+from model_runtime import TFLiteRunner  # noqa: E402
+
+DEFAULT_MODEL = os.path.join("model", "plant_disease_model.h5")
+DEFAULT_OUT = os.path.join("model", "plant_disease_model.tflite")
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png")
+
+
+def load_images(directory, input_shape, limit=None):
+    """(n, H, W, 3) float32 batch, preprocessed the way server.py does."""
+    if not directory:
+        return None
+    paths = sorted(p for pat in IMAGE_PATTERNS for p in glob.glob(os.path.join(directory, pat)))
+    if limit:
+        paths = paths[:limit]
+    if not paths:
+        return None
+    preprocessor = ImagePreprocessor(input_shape)
+    batch = preprocessor.empty_batch(len(paths))
+    for i, p in enumerate(paths):
+        with open(p, "rb") as f:
+            preprocessor.preprocess(f.read(), out=batch[i])
+    return batch
+
+
+def convert(model, quantize, calibration):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "int8":
+        if calibration is None:
+            raise SystemExit("--quantize int8 needs --calibration-dir with sample images")
+
+        def representative_dataset():
+            for img in calibration:
+                yield [img[None, ...]]
+
+        converter.representative_dataset = representative_dataset
+    return converter.convert()
+
+
+def accuracy_report(model, runner, images):
+    keras_probs = model(images, training=False).numpy()
+    tflite_probs = np.concatenate([runner(images[i:i + 8]) for i in range(0, len(images), 8)])
+    diff = np.abs(keras_probs - tflite_probs)
+    agreement = float(np.mean(keras_probs.argmax(1) == tflite_probs.argmax(1)) * 100.0)
+    return {
+        "images": len(images),
+        "top1_agreement_pct": round(agreement, 2),
+        "mean_abs_prob_diff": float(diff.mean()),
+        "max_abs_prob_diff": float(diff.max()),
+        "max_confidence_diff_pct": float(np.abs(keras_probs.max(1) - tflite_probs.max(1)).max() * 100.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--quantize", choices=["none", "dynamic", "int8"], default="none")
+    parser.add_argument("--calibration-dir")
+    parser.add_argument("--calibration-limit", type=int, default=200)
+    parser.add_argument("--eval-dir")
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    calibration = load_images(args.calibration_dir, model.input_shape, args.calibration_limit)
+    with open(args.out, "wb") as f:
+        f.write(convert(model, args.quantize, calibration))
+
+    print(f"Exported {args.model} ({os.path.getsize(args.model) / 1e6:.2f} MB) -> "
+          f"{args.out} ({os.path.getsize(args.out) / 1e6:.2f} MB), quantize={args.quantize}")
+
+    images = load_images(args.eval_dir, model.input_shape)
+    source = args.eval_dir
+    if images is None and calibration is not None:
+        images, source = calibration, args.calibration_dir
+    if images is None:
+        rng = np.random.default_rng(0)
+        images, source = rng.random((32,) + tuple(model.input_shape[1:]), dtype=np.float32), "random inputs"
+
+    report = accuracy_report(model, TFLiteRunner(args.out), images)
+    print(f"\n=== Accuracy delta vs Keras ({source}) ===")
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Indexed store for the /soil-predict history that soil_server.py used to
+append to soil_history.jsonl and re-scan (last 300 lines) on every request.
+
+Records go into one SQLite table in WAL mode, with indexes on district,
+region and a spatial cell. The cell is a CELL_DEG x CELL_DEG square
+(spatial_index.py), the same 0.02 degree tolerance the old
+nearby-coordinates match used. A place's history is then an indexed
+lookup over every record, not just the most recent 300 (neighbor scores
+are aggregated incrementally from the same rows, see neighbor_stats.py).
+The first time the database is created, an existing soil_history.jsonl
+is imported into it.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from service_logging import log_event
+from spatial_index import CELL_DEG, cell_of, neighbor_cells
+
+HISTORY_FIELDS = ("timestamp", "score", "N", "P", "K", "pH")
+# PRAGMA synchronous per fsync policy: in WAL mode "normal" fsyncs only at
+# checkpoints (a power cut can lose the last commits, never corrupt), "full"
+# fsyncs every commit (one per writer batch), "off" leaves it to the OS
+SYNC_POLICIES = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+
+def same_place(entry, district, region, lat, lon):
+    """place_history's match, for an entry that is not in the database yet."""
+    return bool(
+        (district and entry.get("district") == district)
+        or (region and entry.get("region") == region)
+        or (abs(entry["latitude"] - lat) <= CELL_DEG and abs(entry["longitude"] - lon) <= CELL_DEG)
+    )
+
+
+class HistoryStore:
+    def __init__(self, path, import_jsonl=None, sync="normal"):
+        if sync not in SYNC_POLICIES:
+            raise ValueError(f"sync must be one of {tuple(SYNC_POLICIES)}, got {sync!r}")
+        self.path = path
+        self._lock = threading.Lock()
+        created = not os.path.exists(path)
+        # SQLite's own file locks serialize writers from every worker process;
+        # a writer that finds the database locked waits up to `timeout` seconds.
+        # Writes get their own connection, so in WAL mode reads never wait on them.
+        self._write_lock = threading.Lock()
+        self._write_conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.execute(f"PRAGMA synchronous={SYNC_POLICIES[sync]}")
+        self._write_conn.executescript(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, district TEXT, region TEXT, "
+            "latitude REAL NOT NULL, longitude REAL NOT NULL, cell INTEGER NOT NULL, "
+            "score NUMERIC, N REAL, P REAL, K REAL, pH REAL);"
+            "CREATE INDEX IF NOT EXISTS history_district ON history (district, timestamp);"
+            "CREATE INDEX IF NOT EXISTS history_region ON history (region, timestamp);"
+            "CREATE INDEX IF NOT EXISTS history_cell ON history (cell, timestamp);"
+        )
+        self._write_conn.commit()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        if created and import_jsonl and os.path.exists(import_jsonl):
+            self.import_jsonl(import_jsonl)
+
+    def import_jsonl(self, path):
+        """Load records from the old soil_history.jsonl log; malformed lines are skipped."""
+        entries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    float(rec["latitude"]), float(rec["longitude"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                entries.append(rec)
+        self.add_many(entries)
+        return len(entries)
+
+    def add(self, entry):
+        self.add_many([entry])
+
+    def add_many(self, entries):
+        rows = [
+            (
+                e.get("timestamp"),
+                e.get("district"),
+                e.get("region"),
+                float(e["latitude"]),
+                float(e["longitude"]),
+                cell_of(float(e["latitude"]), float(e["longitude"])),
+                e.get("score"),
+                e.get("N"),
+                e.get("P"),
+                e.get("K"),
+                e.get("pH"),
+            )
+            for e in entries
+        ]
+        with self._write_lock:
+            self._write_conn.executemany(
+                "INSERT INTO history (timestamp, district, region, latitude, longitude, cell, "
+                "score, N, P, K, pH) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._write_conn.commit()
+
+    def place_history(self, district, region, lat, lon, limit=10, pending=()):
+        """
+        The latest `limit` records for this place, oldest first: same
+        district, same region, or within CELL_DEG in both lat and lon
+        (the matching soil_server.py always used). `pending` entries (not
+        written yet, see HistoryWriter) are matched and merged in.
+        """
+        cells = neighbor_cells(lat, lon)
+        # One indexed query per criterion, each already limited, then merged
+        queries = [
+            "SELECT id FROM (SELECT id, timestamp FROM history WHERE cell IN (%s) "
+            "AND abs(latitude - ?) <= ? AND abs(longitude - ?) <= ? "
+            "ORDER BY timestamp DESC LIMIT ?)" % ",".join("?" * len(cells))
+        ]
+        params = [*cells, lat, CELL_DEG, lon, CELL_DEG, limit]
+        if district:
+            queries.append("SELECT id FROM (SELECT id FROM history WHERE district = ? ORDER BY timestamp DESC LIMIT ?)")
+            params += [district, limit]
+        if region:
+            queries.append("SELECT id FROM (SELECT id FROM history WHERE region = ? ORDER BY timestamp DESC LIMIT ?)")
+            params += [region, limit]
+        sql = (
+            "SELECT %s FROM history WHERE id IN (%s) ORDER BY timestamp DESC LIMIT ?"
+            % (", ".join(HISTORY_FIELDS), " UNION ".join(queries))
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, [*params, limit]).fetchall()
+        # A pending entry may have been written since it was read; keep one copy
+        merged = set(rows)
+        merged.update(
+            tuple(e.get(f) for f in HISTORY_FIELDS)
+            for e in pending
+            if same_place(e, district, region, lat, lon)
+        )
+        latest = sorted(merged, key=lambda row: row[0] or "")[-limit:]
+        return [dict(zip(HISTORY_FIELDS, row)) for row in latest]
+
+    def max_id(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM history").fetchone()[0]
+
+    def rows_since(self, last_id):
+        """(id, district, region, score) of every record after `last_id`, in order."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, district, region, score FROM history WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+
+    def score_counts(self):
+        """(max id, [(district, region, score, count), ...]) over every record up to that id."""
+        last_id = self.max_id()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT district, region, score, COUNT(*) FROM history "
+                "WHERE id <= ? AND score IS NOT NULL GROUP BY district, region, score",
+                (last_id,),
+            ).fetchall()
+        return last_id, rows
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def close(self):
+        with self._write_lock:
+            self._write_conn.close()
+        with self._lock:
+            self._conn.close()
+
+
+class HistoryWriter:
+    """
+    Writes history entries from a background thread, so requests never
+    wait on the disk. submit() only queues; the thread writes up to
+    `batch_size` entries per transaction, at least every `interval_s`
+    seconds. After each write it calls `fetch()` (e.g.
+    NeighborStats.new_rows, a database read) without holding the lock,
+    then `on_flush(fetched)` (e.g. NeighborStats.apply, in memory; None
+    without fetch) while the written entries leave the pending list, and
+    finally, outside the lock, `after_flush()` for slower follow-up work
+    such as snapshots.
+    Entries stay visible through pending() until they are written.
+    """
+
+    def __init__(self, store, logger, batch_size=64, interval_s=0.5, max_pending=10000,
+                 fetch=None, on_flush=None, after_flush=None):
+        self.store = store
+        self.logger = logger
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self.max_pending = max_pending
+        self.fetch = fetch
+        self.on_flush = on_flush
+        self.after_flush = after_flush
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                # The disk cannot keep up; losing a history row beats blocking requests
+                self.dropped += 1
+                return False
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._wake.notify()
+        return True
+
+    @contextmanager
+    def pending(self):
+        """
+        Entries not yet written. Writes and fetch() can proceed meanwhile,
+        but on_flush and the removal from this list wait, so data that
+        on_flush folds in is never counted twice.
+        """
+        with self._lock:
+            yield list(self._pending)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._pending) < self.batch_size and not self._closed:
+                    self._wake.wait(self.interval_s)
+                batch = self._pending[: self.batch_size]
+                closed = self._closed
+            if batch:
+                self._write(batch)
+            elif closed:
+                return
+
+    def _write(self, batch):
+        try:
+            self.store.add_many(batch)
+        except Exception:
+            # Keep the entries queued; the next round retries them
+            log_event(self.logger, "history write failed", level=logging.ERROR, entries=len(batch), exc_info=True)
+            time.sleep(self.interval_s)
+            return
+        # The database read happens here, so submit() and pending() never wait on it
+        on_flush, fetched = self.on_flush, None
+        if self.fetch is not None:
+            try:
+                fetched = self.fetch()
+            except Exception:
+                # Nothing to fold in; the next fetch reads these rows again
+                log_event(self.logger, "history fetch failed", level=logging.WARNING, exc_info=True)
+                on_flush = None
+        with self._lock:
+            if on_flush is not None:
+                try:
+                    on_flush(fetched)
+                except Exception:
+                    log_event(self.logger, "history on_flush failed", level=logging.WARNING, exc_info=True)
+            del self._pending[: len(batch)]
+            self.written += len(batch)
+        if self.after_flush is not None:
+            try:
+                self.after_flush()
+            except Exception:
+                log_event(self.logger, "history after_flush failed", level=logging.WARNING, exc_info=True)
+
+    def close(self, timeout=10.0):
+        """Write everything still queued, then stop the thread."""
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._pending), "written": self.written, "dropped": self.dropped}
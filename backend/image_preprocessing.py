@@ -0,0 +1,54 @@
+"""
+Upload decoding and normalization for the disease-detection models.
+
+Phone photos are often 12 MP while the model wants 256x256, so most of
+the work used to be decoding pixels we throw away. ImagePreprocessor:
+
+  * asks the JPEG decoder for a reduced-size image (PIL draft mode, DCT
+    scaling by 1/2, 1/4 or 1/8) that is still at least the model size,
+  * resizes straight to the model input size read from input_shape,
+  * scales to [0, 1] as float32 directly into a caller-provided buffer,
+    instead of building a float64 array and casting it later.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+# Pillow's default for RGB resize, kept so outputs match the old path
+DEFAULT_RESAMPLE = Image.Resampling.BICUBIC
+
+
+class ImagePreprocessor:
+    def __init__(self, input_shape, resample=DEFAULT_RESAMPLE):
+        """input_shape: model input shape, (None, H, W, C)"""
+        height, width, channels = (int(d) for d in input_shape[1:4])
+        if channels != 3:
+            raise ValueError(f"Expected an RGB model input, got {input_shape}")
+        self.size = (width, height)
+        self.shape = (height, width, channels)
+        self.resample = resample
+
+    def decode(self, data):
+        """Raw upload bytes -> RGB PIL image, decoded no larger than needed"""
+        img = Image.open(io.BytesIO(data))
+        if img.format == "JPEG":
+            # Picks the largest DCT scale that keeps both sides >= size
+            img.draft("RGB", self.size)
+        return img.convert("RGB")
+
+    def to_array(self, img, out=None):
+        """RGB PIL image -> (H, W, 3) float32 in [0, 1], written into `out` if given"""
+        if img.size != self.size:
+            img = img.resize(self.size, self.resample)
+        if out is None:
+            out = np.empty(self.shape, dtype=np.float32)
+        np.multiply(np.asarray(img), np.float32(1.0 / 255.0), out=out, casting="unsafe")
+        return out
+
+    def preprocess(self, data, out=None):
+        return self.to_array(self.decode(data), out)
+
+    def empty_batch(self, n):
+        """Preallocated (n, H, W, 3) float32 buffer for preprocess(..., out=batch[i])"""
+        return np.empty((n,) + self.shape, dtype=np.float32)
@@ -0,0 +1,80 @@
+"""
+Dynamic batching for the disease-detection model.
+
+Flask handles each upload on its own thread. Instead of every thread
+calling model.predict on a (1, H, W, 3) array, they submit() their
+preprocessed image to a BatchInferenceWorker. A single background thread
+collects whatever is waiting, up to `max_batch_size` images or
+`timeout_s` after the first one arrived, stacks them into one tensor,
+runs one forward pass and hands each row of the output back to the
+thread that submitted it.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchInferenceWorker:
+    def __init__(self, predict_fn, max_batch_size=16, timeout_s=0.005):
+        """predict_fn: (n, H, W, C) float32 array -> (n, num_classes) array"""
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.timeout_s = timeout_s
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, name="disease-inference", daemon=True
+        )
+        self._thread.start()
+
+        self.batches = 0
+        self.images = 0
+
+    def submit(self, image):
+        """Queue one (H, W, C) image; returns a Future for its output row."""
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def predict(self, images):
+        """Blocking helper: run a list of images through the worker."""
+        futures = [self.submit(img) for img in images]
+        return np.stack([f.result() for f in futures])
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.timeout_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run(batch)
+
+    def _run(self, batch):
+        self.batches += 1
+        self.images += len(batch)
+        try:
+            outputs = self.predict_fn(np.stack([img for img, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), row in zip(batch, outputs):
+            future.set_result(row)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "timeout_ms": self.timeout_s * 1000.0,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,120 @@
+"""
+Inference backends for the disease-detection model.
+
+Every runner takes a float32 batch of shape (n, H, W, C) and returns a
+NumPy array of class scores, so server.py does not care which one is
+active. Select with DISEASE_BACKEND:
+
+    function  traced tf.function with a fixed input signature (default)
+    keras     model.predict, the original path, kept as a fallback
+    tflite    TFLite interpreter over a file written by export_tflite.py
+
+TensorFlow is only imported by the runners that need it; the tflite
+runner prefers the standalone tflite_runtime / ai_edge_litert packages
+when they are installed.
+"""
+import threading
+
+import numpy as np
+
+
+class KerasRunner:
+    name = "keras"
+
+    def __init__(self, model):
+        self.model = model
+        self.input_shape = model.input_shape
+        self.output_shape = model.output_shape
+
+    def __call__(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class FunctionRunner:
+    """
+    Calls the model through a tf.function traced once for a
+    (None, H, W, C) float32 input, skipping the data-adapter setup that
+    model.predict repeats on every call.
+    """
+
+    name = "function"
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self._tf = tf
+        self.model = model
+        self.input_shape = model.input_shape
+        self.output_shape = model.output_shape
+        signature = tf.TensorSpec(
+            shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32
+        )
+        self._forward = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[signature],
+            autograph=False,
+        )
+        # Trace now rather than on the first farmer's request
+        self(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32))
+
+    def __call__(self, batch):
+        batch = self._tf.convert_to_tensor(batch, dtype=self._tf.float32)
+        return self._forward(batch).numpy()
+
+
+def _tflite_interpreter(path):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path)
+
+
+class TFLiteRunner:
+    """
+    Runs a .tflite export. The input tensor is resized whenever the batch
+    size changes; calls are serialized because an interpreter is not
+    thread-safe.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path):
+        self.path = path
+        self.interpreter = _tflite_interpreter(path)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._input["shape"][1:])
+        self.output_shape = (None,) + tuple(int(d) for d in self._output["shape"][1:])
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output["index"]).copy()
+
+
+RUNNERS = {
+    KerasRunner.name: KerasRunner,
+    FunctionRunner.name: FunctionRunner,
+}
+
+
+def build_runner(model, backend):
+    """Runner for an already loaded Keras model (tflite is built from a path)."""
+    if backend not in RUNNERS:
+        raise ValueError(f"Unknown DISEASE_BACKEND {backend!r}, expected one of {sorted(RUNNERS)}")
+    return RUNNERS[backend](model)
@@ -0,0 +1,192 @@
+"""
+Running per-district and per-region score aggregates for /soil-predict's
+neighbor_stats.
+
+Each district and region keeps a count, a sum and a histogram of scores
+(integers 0-100, as soil_server.py computes them) in a Fenwick tree, so
+the average is O(1) and "how many scored <= s" is O(log bins). Nothing
+is rescanned per request.
+
+The aggregates follow the history store's row ids: sync() folds in rows
+added since the last one it saw, whichever process wrote them, so
+several workers sharing one database agree. Entries still queued in a
+HistoryWriter are passed to stats() as `pending`.
+
+The aggregates are snapshotted to JSON every `snapshot_every` new rows
+(maybe_snapshot()) and at exit. A restart loads the snapshot and replays
+only the rows after it. Without a usable snapshot they are rebuilt from
+the database with one GROUP BY query.
+"""
+import json
+import logging
+import os
+import threading
+
+from service_logging import log_event
+
+MAX_SCORE = 100
+
+
+def score_bin(score):
+    return min(max(int(score), 0), MAX_SCORE)
+
+
+class ScoreHistogram:
+    """Score counts in a Fenwick tree, plus the running count and sum."""
+
+    def __init__(self):
+        self.tree = [0] * (MAX_SCORE + 2)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, score, n=1):
+        self.count += n
+        self.total += float(score) * n
+        i = score_bin(score) + 1
+        while i < len(self.tree):
+            self.tree[i] += n
+            i += i & -i
+
+    def count_le(self, score):
+        """Scores <= `score`."""
+        if score < 0:
+            return 0
+        i = score_bin(score) + 1
+        n = 0
+        while i > 0:
+            n += self.tree[i]
+            i -= i & -i
+        return n
+
+    def counts(self):
+        """Per-score counts, for snapshots."""
+        return [self.count_le(s) - self.count_le(s - 1) for s in range(MAX_SCORE + 1)]
+
+    @classmethod
+    def from_counts(cls, counts, total):
+        hist = cls()
+        for score, n in enumerate(counts):
+            if n:
+                hist.add(score, n)
+        hist.total = float(total)
+        return hist
+
+
+class NeighborStats:
+    def __init__(self, store, logger, snapshot_path=None, snapshot_every=500):
+        self.store = store
+        self.logger = logger
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        self.groups = {}
+        self.last_id = 0
+        self._since_snapshot = 0
+        if not self._load_snapshot():
+            self._rebuild()
+        self.sync()
+
+    def _group(self, kind, name):
+        key = (kind, name)
+        if key not in self.groups:
+            self.groups[key] = ScoreHistogram()
+        return self.groups[key]
+
+    def _apply(self, district, region, score, n=1):
+        if score is None:
+            return
+        if district:
+            self._group("district", district).add(score, n)
+        if region:
+            self._group("region", region).add(score, n)
+
+    def _rebuild(self):
+        self.groups = {}
+        self.last_id, rows = self.store.score_counts()
+        for district, region, score, n in rows:
+            self._apply(district, region, score, n)
+        log_event(self.logger, "neighbor stats rebuilt", groups=len(self.groups), last_id=self.last_id)
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            # A snapshot from another (or a recreated) database cannot be replayed onto
+            if snap["db"] != os.path.abspath(self.store.path) or snap["last_id"] > self.store.max_id():
+                return False
+            self.groups = {
+                (g["kind"], g["name"]): ScoreHistogram.from_counts(g["counts"], g["sum"])
+                for g in snap["groups"]
+            }
+            self.last_id = snap["last_id"]
+        except (OSError, ValueError, KeyError, TypeError):
+            log_event(self.logger, "neighbor stats snapshot unreadable", level=logging.WARNING, exc_info=True)
+            return False
+        return True
+
+    def sync(self):
+        """Fold in history rows added since the last sync (by any process)."""
+        self.apply(self.new_rows())
+
+    def new_rows(self):
+        """The database read half of sync(): rows after the last one applied."""
+        return self.store.rows_since(self.last_id)
+
+    def apply(self, rows):
+        """The in-memory half of sync(); rows another sync already applied are skipped."""
+        with self._lock:
+            for row_id, district, region, score in rows:
+                if row_id <= self.last_id:
+                    continue
+                self._apply(district, region, score)
+                self.last_id = row_id
+                self._since_snapshot += 1
+
+    def maybe_snapshot(self):
+        """snapshot() once `snapshot_every` rows came in since the last one."""
+        if self.snapshot_path and self._since_snapshot >= self.snapshot_every:
+            self.snapshot()
+
+    def stats(self, district, region, score, pending=()):
+        """
+        (count, average, how many scored <= `score`) over the comparison
+        group: the same district, or the same region when no district was
+        given, counting `pending` entries not written yet. None when the
+        group is empty.
+        """
+        if district:
+            key, field, name = ("district", district), "district", district
+        elif region:
+            key, field, name = ("region", region), "region", region
+        else:
+            return None
+        extra = [float(e["score"]) for e in pending if e.get(field) == name and e.get("score") is not None]
+        with self._lock:
+            hist = self.groups.get(key)
+            count = (hist.count if hist else 0) + len(extra)
+            if count == 0:
+                return None
+            total = (hist.total if hist else 0.0) + sum(extra)
+            count_le = (hist.count_le(score) if hist else 0) + sum(1 for s in extra if s <= score)
+        return count, total / count, count_le
+
+    def snapshot(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            snap = {
+                "db": os.path.abspath(self.store.path),
+                "last_id": self.last_id,
+                "groups": [
+                    {"kind": kind, "name": name, "counts": hist.counts(), "sum": hist.total}
+                    for (kind, name), hist in self.groups.items()
+                ],
+            }
+            self._since_snapshot = 0
+        # Write-then-rename, so a crash never leaves half a snapshot
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snap, f)
+        os.replace(tmp_path, self.snapshot_path)
@@ -1,111 +1,127 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
-import numpy as np
-from PIL import Image
-import io
+import logging
 import os
+import sys
+
+# Shared structured logging lives next to the groundwater model
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MODEL"))
+from service_logging import RequestTimer, get_logger, log_event
+from model_loading import ModelRegistry
+from disease_model import expected_batch_sizes, load_classifier, prediction_body
+
+logger = get_logger("disease-api")
 
 app = Flask(__name__)
 CORS(app)
 
-# ✅ Model path
-MODEL_PATH = os.path.join("model", "plant_disease_model.h5")
-
-# ✅ Define class labels (same order as during training)
-# Note: Model has 3 output classes based on model.output_shape
-class_labels = [
-    "Healthy",
-    "Powdery",
-    "Rust"
-]
-
-# Load the trained model
-try:
-    model = load_model(MODEL_PATH)
-    print("[SUCCESS] Model loaded successfully!")
-    print(f"[INFO] Model input shape: {model.input_shape}")
-    print(f"[INFO] Model output shape: {model.output_shape}")
-    print(f"[INFO] Number of classes: {len(class_labels)}")
-except Exception as e:
-    print(f"[ERROR] Error loading model: {e}")
-    model = None
+# The model (and TensorFlow) load on first use or in a background preload
+# (MODEL_PRELOAD); labels come from model/plant_disease_model.json and the
+# input size from the model itself (see disease_model.py)
+models = ModelRegistry(logger)
+disease = models.add(
+    "disease",
+    lambda: load_classifier(logger, models),
+    warmup=lambda classifier, batch_size: classifier.warmup(batch_size),
+    batch_sizes=expected_batch_sizes(),
+)
+models.preload_from_env()
+
+
+@app.route("/healthz")
+def healthz():
+    return jsonify(models.health())
+
+
+@app.route("/readyz")
+def readyz():
+    body, status = models.readiness()
+    return jsonify(body), status
+
 
 @app.route("/")
 def home():
     return jsonify({
         "message": "Plant Disease Detection API is running!",
-        "model_loaded": model is not None,
+        "model_loaded": disease.loaded,
         "endpoints": {
             "GET /": "API status",
+            "GET /healthz": "Process is up",
+            "GET /readyz": "Model loaded (503 until then)",
             "GET /model-info": "Model information",
-            "POST /predict": "Disease prediction"
+            "POST /predict": "Disease prediction",
+            "POST /predict/batch": "Disease prediction for several files"
         }
     })
 
 @app.route("/model-info")
 def model_info():
-    if model is None:
+    classifier = disease.get_or_none()
+    if classifier is None:
         return jsonify({"error": "Model not loaded"}), 500
-    
-    return jsonify({
-        "model_loaded": True,
-        "input_shape": str(model.input_shape),
-        "output_shape": str(model.output_shape),
-        "classes": class_labels,
-        "num_classes": len(class_labels)
-    })
+
+    return jsonify(classifier.info())
 
 @app.route("/predict", methods=["POST"])
 def predict():
-    if model is None:
+    classifier = disease.get_or_none()
+    if classifier is None:
         return jsonify({"error": "Model not loaded. Please check server logs."}), 500
-        
+
     if "file" not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
 
     file = request.files["file"]
-    
+
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
 
+    timer = RequestTimer()
     try:
-        # Read image directly from upload
-        img = Image.open(io.BytesIO(file.read())).convert("RGB")
+        # Read image directly from upload; repeated uploads come from the cache
+        result, source, scores = classifier.classify(file.read(), timer)
 
-        # Resize according to model input (256x256 as per model.input_shape)
-        img = img.resize((256, 256))
+        # Return result
+        response = jsonify(prediction_body(result))
+        timer.mark("serialize")
+        fields = {"cache": source} if source else {"scores": [round(float(p), 4) for p in scores]}
+        log_event(logger, "request", sampled=True, path="/predict", **result, **fields, **timer.fields())
+        return response
 
-        # Convert to array and normalize
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)  # shape: (1,256,256,3)
+    except Exception as e:
+        log_event(logger, "prediction error", level=logging.ERROR, exc_info=True)
+        return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
 
-        # Predict
-        predictions = model.predict(img_array, verbose=0)
-        print("[PREDICT] Raw model output:", predictions)
-        print("[PREDICT] Predicted index:", np.argmax(predictions[0]))
-        print("[PREDICT] Confidence scores:", predictions[0])
-        
-        predicted_index = np.argmax(predictions, axis=1)[0]
-        confidence = float(np.max(predictions) * 100)
 
-        # Ensure valid index range
-        predicted_class = class_labels[predicted_index] if predicted_index < len(class_labels) else "Unknown"
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Multi-file upload (form field "files", repeated). Returns one result
+    per file in upload order; a file that cannot be decoded gets an
+    "error" entry instead of failing the whole request.
+    """
+    classifier = disease.get_or_none()
+    if classifier is None:
+        return jsonify({"error": "Model not loaded. Please check server logs."}), 500
 
-        # Return result
-        return jsonify({
-            "prediction": predicted_class,
-            "confidence": round(confidence, 2)
-        })
+    files = request.files.getlist("files")
+    if not files:
+        return jsonify({"error": "No files uploaded"}), 400
 
+    timer = RequestTimer()
+    try:
+        results = classifier.classify_many([file.read() for file in files], timer)
     except Exception as e:
-        print(f"[ERROR] Prediction error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log_event(logger, "batch prediction error", level=logging.ERROR, exc_info=True)
         return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
 
+    predictions = [{"filename": file.filename, **prediction_body(result)} for file, result in zip(files, results)]
+    response = jsonify({"predictions": predictions})
+    timer.mark("serialize")
+    log_event(logger, "request", sampled=True, path="/predict/batch", files=len(files), **timer.fields())
+    return response
+
 
 if __name__ == "__main__":
-    # Debug mode for development only
+    # Debug mode for development only; disease_api.py is the async server
     app.run(host="0.0.0.0", port=5000, debug=True)
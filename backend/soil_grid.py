@@ -0,0 +1,194 @@
+"""
+Precomputed soil/crop answers for soil_server.py on a lat/lon grid.
+
+/soil-predict depends only on (district, region, latitude, longitude),
+and every district in crop.csv covers a small box. This job evaluates
+the soil model and crop_model once per grid point over each district's
+box (plus a margin). It saves [N, P, K, pH, crop probabilities...] as
+one float32 array that soil_server.py memory-maps. A request inside the
+box is then answered by bilinear interpolation (or the nearest grid
+point) in microseconds. Unknown districts and points outside the box
+still go to the live models.
+
+Usage (from backend/, after crop_system.py has trained the models):
+    python soil_grid.py build [--step 0.005] [--margin 0.05]
+    python soil_grid.py report [--samples 2000]
+
+The grid records the size and content digest of the artifacts it was built from.
+soil_server.py ignores a grid that no longer matches them, so retraining
+without rebuilding falls back to live inference rather than stale answers.
+
+`report` compares grid answers with the live models at random points
+between grid nodes: soil error per target, crop top-1/top-3 agreement,
+and lookup time.
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+N_SOIL = 4                     # N, P, K, pH, then one column per crop class
+MODES = ("linear", "nearest")
+
+
+class SoilGrid:
+    def __init__(self, data, mode="linear"):
+        if mode not in MODES:
+            raise ValueError(f"grid mode must be one of {MODES}, got {mode!r}")
+        self.mode = mode
+        self.step = float(data["step"])
+        self.values = data["values"]
+        self.stamp = data["stamp"]
+        self.soil_model = data["soil_model"]
+        # (district, region) -> (lat0, lon0, ny, nx, offset into values)
+        self.cells = {
+            tuple(key): (float(o[0]), float(o[1]), int(s[0]), int(s[1]), int(off))
+            for key, o, s, off in zip(data["keys"], data["origin"], data["shape"], data["offset"])
+        }
+
+    @classmethod
+    def load(cls, path, mode="linear", mmap_mode="r"):
+        return cls(joblib.load(path, mmap_mode=mmap_mode), mode)
+
+    def lookup(self, district, region, lat, lon):
+        """[N, P, K, pH, crop probabilities...] at (lat, lon), or None off the grid."""
+        cell = self.cells.get((district, region))
+        if cell is None:
+            return None
+        lat0, lon0, ny, nx, offset = cell
+        i = (lat - lat0) / self.step
+        j = (lon - lon0) / self.step
+        if not (0.0 <= i <= ny - 1 and 0.0 <= j <= nx - 1):
+            return None
+        if self.mode == "nearest":
+            return np.asarray(self.values[offset + int(round(i)) * nx + int(round(j))], dtype=np.float64)
+
+        i0 = min(int(i), ny - 2)
+        j0 = min(int(j), nx - 2)
+        di = i - i0
+        dj = j - j0
+        base = offset + i0 * nx + j0
+        # Two rows of two neighbouring points each: (2, 2, columns)
+        corners = np.array([self.values[base:base + 2], self.values[base + nx:base + nx + 2]], dtype=np.float64)
+        return np.array([1.0 - di, di]) @ (np.array([1.0 - dj, dj]) @ corners)
+
+
+def grid_boxes(df, step, margin):
+    """(district, region, lat axis, lon axis) for each pair in crop.csv."""
+    boxes = []
+    for (district, region), rows in df.groupby(["District", "Region"]):
+        lat = np.arange(rows["Latitude"].min() - margin, rows["Latitude"].max() + margin + step, step)
+        lon = np.arange(rows["Longitude"].min() - margin, rows["Longitude"].max() + margin + step, step)
+        boxes.append((district, region, lat, lon))
+    return boxes
+
+
+def evaluate(m, district, region, lat, lon, chunk=20000):
+    """Soil values and crop probabilities, exactly as /soil-predict computes them live."""
+    dist_enc = int(m.le_district.transform([district])[0])
+    reg_enc = int(m.le_region.transform([region])[0])
+    out = []
+    for start in range(0, len(lat), chunk):
+        n = len(lat[start:start + chunk])
+        X = np.column_stack([lat[start:start + chunk], lon[start:start + chunk], np.full(n, dist_enc), np.full(n, reg_enc)])
+        soil = np.asarray(m.soil_model.predict(X), dtype=np.float64)
+        probs = m.crop_model.predict_proba(np.column_stack([soil, X]))
+        out.append(np.hstack([soil, probs]))
+    return np.vstack(out)
+
+
+def build(m, stamp, df, step, margin):
+    keys, origin, shape, offset, values = [], [], [], [], []
+    total = 0
+    for district, region, lat, lon in grid_boxes(df, step, margin):
+        lat_mesh, lon_mesh = np.meshgrid(lat, lon, indexing="ij")
+        values.append(evaluate(m, district, region, lat_mesh.ravel(), lon_mesh.ravel()).astype(np.float32))
+        keys.append([district, region])
+        origin.append([lat[0], lon[0]])
+        shape.append([len(lat), len(lon)])
+        offset.append(total)
+        total += lat_mesh.size
+    return {
+        "keys": keys,
+        "origin": np.array(origin),
+        "shape": np.array(shape, dtype=np.int32),
+        "offset": np.array(offset, dtype=np.int64),
+        "step": step,
+        "values": np.ascontiguousarray(np.vstack(values)),
+        "stamp": stamp,
+        "soil_model": m.soil_model_kind,
+    }
+
+
+def report(m, grid, samples, seed=0):
+    rng = np.random.default_rng(seed)
+    boxes = [(d, r) for d, r in grid.cells]
+    picks = rng.integers(len(boxes), size=samples)
+    points = []
+    for k in picks:
+        district, region = boxes[k]
+        lat0, lon0, ny, nx, _ = grid.cells[(district, region)]
+        # Uniform over the box, so mostly between grid nodes
+        points.append((district, region,
+                       lat0 + rng.uniform(0, ny - 1) * grid.step,
+                       lon0 + rng.uniform(0, nx - 1) * grid.step))
+
+    start = time.perf_counter()
+    live = np.vstack([evaluate(m, d, r, np.array([lat]), np.array([lon])) for d, r, lat, lon in points])
+    live_us = (time.perf_counter() - start) / samples * 1e6
+
+    labels = ["N", "P", "K", "pH"]
+    print(f"grid step {grid.step} deg, {len(grid.cells)} districts, "
+          f"{len(grid.values)} points, soil model {grid.soil_model}")
+    print(f"live models: {live_us:.0f} us/request")
+    for mode in MODES:
+        grid.mode = mode
+        start = time.perf_counter()
+        approx = np.vstack([grid.lookup(d, r, lat, lon) for d, r, lat, lon in points])
+        grid_us = (time.perf_counter() - start) / samples * 1e6
+
+        err = np.abs(approx[:, :N_SOIL] - live[:, :N_SOIL])
+        top1 = np.mean(approx[:, N_SOIL:].argmax(1) == live[:, N_SOIL:].argmax(1))
+        top3 = np.mean([
+            len(set(np.argsort(a)[-3:]) & set(np.argsort(b)[-3:])) / 3.0
+            for a, b in zip(approx[:, N_SOIL:], live[:, N_SOIL:])
+        ])
+        print(f"\n{mode}: {grid_us:.1f} us/lookup")
+        print(f"  {'target':<6} {'MAE':>8} {'p95':>8} {'max':>8}")
+        for i, name in enumerate(labels):
+            print(f"  {name:<6} {err[:, i].mean():>8.3f} {np.percentile(err[:, i], 95):>8.3f} {err[:, i].max():>8.3f}")
+        print(f"  crop top-1 agreement {top1 * 100:.1f}%, top-3 overlap {top3 * 100:.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_cmd = sub.add_parser("build")
+    build_cmd.add_argument("--step", type=float, default=0.005, help="grid spacing in degrees")
+    build_cmd.add_argument("--margin", type=float, default=0.05, help="degrees added around each district")
+    report_cmd = sub.add_parser("report")
+    report_cmd.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    # The models (and the paths) are whatever soil_server.py would serve;
+    # soil_models only reads them, no history database or writer thread
+    import pandas as pd
+    import soil_models
+    from service_logging import get_logger
+
+    m = soil_models.load_soil_models(get_logger("soil-grid"), grid=False)
+    if args.command == "build":
+        df = pd.read_csv(soil_models.CROP_CSV_PATH)
+        start = time.perf_counter()
+        data = build(m, soil_models.artifact_stamp(m.soil_model_kind), df, args.step, args.margin)
+        joblib.dump(data, soil_models.SOIL_GRID_PATH)
+        print(f"{len(data['values'])} grid points in {time.perf_counter() - start:.1f} s -> "
+              f"{soil_models.SOIL_GRID_PATH} ({os.path.getsize(soil_models.SOIL_GRID_PATH) / 1e6:.1f} MB)")
+    else:
+        report(m, SoilGrid.load(soil_models.SOIL_GRID_PATH), args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Soil and crop models trained by projectavishkar/crop_system.py, as
+/soil-predict serves them.
+
+soil_server.py registers load_soil_models() with its ModelRegistry;
+offline jobs such as `python soil_grid.py build` call it directly. This
+module only reads the artifacts: it does not open the prediction history
+or start any thread.
+"""
+import csv
+import hashlib
+import logging
+import os
+import sys
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import joblib
+import numpy as np
+
+# ---- Paths: load models & encoders from projectavishkar ----
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECTAVISHKAR_DIR = os.path.join(BASE_DIR, "..", "projectavishkar")
+
+LE_DISTRICT_PATH = os.path.join(PROJECTAVISHKAR_DIR, "le_district.pkl")
+LE_REGION_PATH = os.path.join(PROJECTAVISHKAR_DIR, "le_region.pkl")
+LE_CROP_PATH = os.path.join(PROJECTAVISHKAR_DIR, "le_crop.pkl")
+
+SOIL_N_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_N.pkl")
+SOIL_P_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_P.pkl")
+SOIL_K_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_K.pkl")
+SOIL_PH_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_pH.pkl")
+SOIL_MULTI_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_multi.pkl")
+SOIL_FUSED_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_fused.flat.joblib")
+SOIL_GRID_PATH = os.environ.get("SOIL_GRID_PATH") or os.path.join(PROJECTAVISHKAR_DIR, "soil_grid.joblib")
+CROP_MODEL_PATH = os.path.join(PROJECTAVISHKAR_DIR, "crop_model.pkl")
+CROP_CSV_PATH = os.path.join(PROJECTAVISHKAR_DIR, "crop.csv")
+
+# Memory-map the flat forests written by `crop_system.py --mmap` when they
+# exist, so every worker shares the same pages. Set SOIL_MMAP=0 to always
+# load the sklearn pickles instead.
+USE_MMAP = os.environ.get("SOIL_MMAP", "1") != "0"
+
+# Which forest predicts [N, P, K, pH]; every choice is one predict() call:
+#   auto (default)  multi if crop_system.py --multi-output saved it, else
+#                   fused if --mmap saved it, else the four separate models
+#   multi           soil_model_multi.pkl, one multi-output regressor
+#   fused           soil_model_fused.flat.joblib, the four separate forests
+#                   in one flat forest (same answers, one tree walk)
+#   separate        soil_model_{N,P,K,pH}.pkl, predicted one after another
+SOIL_MODEL_KINDS = ("auto", "multi", "fused", "separate")
+SOIL_MODEL = os.environ.get("SOIL_MODEL", "auto")
+if SOIL_MODEL not in SOIL_MODEL_KINDS:
+    raise ValueError(f"SOIL_MODEL must be one of {SOIL_MODEL_KINDS}, got {SOIL_MODEL!r}")
+
+# Answers precomputed by `python soil_grid.py build` are served for points
+# inside each district's grid (SOIL_GRID=0 to always run the models);
+# SOIL_GRID_MODE is linear (bilinear interpolation) or nearest
+USE_GRID = os.environ.get("SOIL_GRID", "1") != "0"
+GRID_MODE = os.environ.get("SOIL_GRID_MODE", "linear")
+
+sys.path.append(os.path.join(BASE_DIR, "..", "MODEL"))
+from forest import FlatForest
+from spatial_index import SpatialIndex
+from service_logging import log_event
+from soil_grid import SoilGrid
+
+
+def flat_path_for(pkl_path):
+    return pkl_path[: -len(".pkl")] + ".flat.joblib"
+
+
+def load_forest(pkl_path):
+    flat_path = flat_path_for(pkl_path)
+    if USE_MMAP and os.path.exists(flat_path):
+        return FlatForest.load(flat_path, mmap_mode="r")
+    return joblib.load(pkl_path)
+
+
+def forest_exists(pkl_path):
+    return os.path.exists(pkl_path) or (USE_MMAP and os.path.exists(flat_path_for(pkl_path)))
+
+
+class SeparateSoilModels:
+    """The four per-target forests behind the single predict() of the multi-output model."""
+
+    def __init__(self, models):
+        self.models = models
+
+    def predict(self, X):
+        return np.column_stack([model.predict(X) for model in self.models])
+
+
+SOIL_MODEL_PATHS = {
+    "multi": [SOIL_MULTI_PATH],
+    "fused": [SOIL_FUSED_PATH],
+    "separate": [SOIL_N_PATH, SOIL_P_PATH, SOIL_K_PATH, SOIL_PH_PATH],
+}
+
+
+def load_soil_model():
+    """(kind, model) where model.predict(X) returns (n, 4) [N, P, K, pH]."""
+    if SOIL_MODEL == "multi" or (SOIL_MODEL == "auto" and forest_exists(SOIL_MULTI_PATH)):
+        return "multi", load_forest(SOIL_MULTI_PATH)
+    if SOIL_MODEL == "fused" or (
+        SOIL_MODEL == "auto" and USE_MMAP and os.path.exists(SOIL_FUSED_PATH)
+    ):
+        return "fused", FlatForest.load(SOIL_FUSED_PATH, mmap_mode="r")
+    return "separate", SeparateSoilModels([load_forest(path) for path in SOIL_MODEL_PATHS["separate"]])
+
+
+def load_samples(path):
+    """crop.csv soil samples, with a haversine index over their locations grouped by region."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = [
+            {
+                "district": r["District"],
+                "region": r["Region"],
+                "latitude": float(r["Latitude"]),
+                "longitude": float(r["Longitude"]),
+                "N": float(r["N"]),
+                "P": float(r["P"]),
+                "K": float(r["K"]),
+                "pH": float(r["pH"]),
+                "crop": r["Crop"],
+            }
+            for r in csv.DictReader(f)
+        ]
+    index = SpatialIndex(
+        [r["latitude"] for r in rows],
+        [r["longitude"] for r in rows],
+        groups=[r["region"] for r in rows],
+    )
+    return SimpleNamespace(rows=rows, index=index)
+
+
+# Encoders, crop model and samples, each loaded (and timed) on its own
+SOIL_ARTIFACTS = {
+    "le_district": (LE_DISTRICT_PATH, joblib.load),
+    "le_region": (LE_REGION_PATH, joblib.load),
+    "le_crop": (LE_CROP_PATH, joblib.load),
+    "crop_model": (CROP_MODEL_PATH, load_forest),
+    "samples": (CROP_CSV_PATH, load_samples),
+}
+
+
+def file_digest(path, block=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def artifact_stamp(kind):
+    """
+    Size and content digest of every artifact the answers depend on, to
+    tell a stale grid. Content rather than mtime, which a checkout or copy
+    changes without changing the models.
+    """
+    stamp = []
+    for path in [p for p, _ in SOIL_ARTIFACTS.values()] + SOIL_MODEL_PATHS[kind]:
+        candidates = (path, flat_path_for(path)) if path.endswith(".pkl") else (path,)
+        for p in candidates:
+            if os.path.exists(p):
+                stamp.append([os.path.basename(p), os.path.getsize(p), file_digest(p)])
+    return stamp
+
+
+def load_soil_grid(kind, logger):
+    """The precomputed grid, or None when disabled, missing or built from other models."""
+    if not USE_GRID or not os.path.exists(SOIL_GRID_PATH):
+        return None
+    grid = SoilGrid.load(SOIL_GRID_PATH, GRID_MODE)
+    if grid.soil_model != kind or list(map(list, grid.stamp)) != artifact_stamp(kind):
+        log_event(logger, "soil grid is stale, serving live predictions", level=logging.WARNING,
+                  path=SOIL_GRID_PATH)
+        return None
+    return grid
+
+
+def load_soil_models(logger, timed=lambda phase: nullcontext(), grid=True):
+    """
+    Every artifact /soil-predict uses, as one namespace. timed:
+    ModelRegistry.timed, to break the load down into startup phases.
+    grid=False skips the precomputed grid (e.g. while rebuilding it).
+    """
+    with timed("import sklearn"):
+        import sklearn.ensemble  # noqa: F401  (what unpickling the forests pulls in)
+    loaded = {}
+    for name, (path, load) in SOIL_ARTIFACTS.items():
+        with timed(f"load {name}"):
+            loaded[name] = load(path)
+    with timed("load soil_model"):
+        loaded["soil_model_kind"], loaded["soil_model"] = load_soil_model()
+    with timed("load soil_grid"):
+        loaded["grid"] = load_soil_grid(loaded["soil_model_kind"], logger) if grid else None
+    log_event(
+        logger,
+        "loaded encoders, soil models, and crop model",
+        soil_model=loaded["soil_model_kind"],
+        grid=loaded["grid"] is not None,
+    )
+    return SimpleNamespace(**loaded)
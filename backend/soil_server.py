@@ -1,79 +1,219 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import atexit
+import csv
+import io
+import json
+import math
 import os
-import joblib
+import logging
 import numpy as np
-import traceback
-import json
 from datetime import datetime
 
 app = Flask(__name__)
 CORS(app)
 
-# ---- Paths: load models & encoders from projectavishkar ----
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PROJECTAVISHKAR_DIR = os.path.join(BASE_DIR, "..", "projectavishkar")
 HISTORY_PATH = os.path.join(BASE_DIR, "soil_history.jsonl")
+HISTORY_DB_PATH = os.environ.get("SOIL_HISTORY_DB") or os.path.join(BASE_DIR, "soil_history.db")
+STATS_SNAPSHOT_PATH = os.environ.get("SOIL_STATS_SNAPSHOT") or os.path.join(BASE_DIR, "soil_stats.json")
+
+# Models, encoders and their paths (SOIL_MODEL, SOIL_MMAP, SOIL_GRID*) are
+# in soil_models.py, which also puts MODEL/ on sys.path
+from soil_models import load_soil_models
+from model_loading import ModelRegistry
+from service_logging import RequestTimer, get_logger, log_event
+from soil_grid import N_SOIL
+from history_store import HistoryStore, HistoryWriter
+from neighbor_stats import NeighborStats
+
+logger = get_logger("soil-api")
+models = ModelRegistry(logger)
+
+# Prediction history (SQLite, indexed by district, region and location);
+# created from soil_history.jsonl the first time. SOIL_HISTORY_SYNC is the
+# fsync policy: off, normal (default) or full
+history = HistoryStore(
+    HISTORY_DB_PATH,
+    import_jsonl=HISTORY_PATH,
+    sync=os.environ.get("SOIL_HISTORY_SYNC", "normal"),
+)
+# Per-district/region score aggregates, snapshotted every
+# SOIL_STATS_SNAPSHOT_EVERY new records and at exit
+neighbor_stats = NeighborStats(
+    history,
+    logger,
+    snapshot_path=STATS_SNAPSHOT_PATH,
+    snapshot_every=int(os.environ.get("SOIL_STATS_SNAPSHOT_EVERY", "500")),
+)
+# Requests only queue their history entry; a background thread writes
+# batches of SOIL_HISTORY_BATCH at least every SOIL_HISTORY_FLUSH_MS
+history_writer = HistoryWriter(
+    history,
+    logger,
+    batch_size=int(os.environ.get("SOIL_HISTORY_BATCH", "64")),
+    interval_s=float(os.environ.get("SOIL_HISTORY_FLUSH_MS", "500")) / 1000.0,
+    fetch=neighbor_stats.new_rows,
+    on_flush=neighbor_stats.apply,
+    after_flush=neighbor_stats.maybe_snapshot,
+)
+# atexit runs last-registered first: write the queue, then snapshot
+atexit.register(neighbor_stats.snapshot)
+atexit.register(history_writer.close)
+
+
+def nearest_sample(samples, region, lat, lon):
+    """The closest real crop.csv sample in the same region (any region if unknown)."""
+    pos, km = samples.index.nearest(lat, lon, k=1, group=region or None)
+    return {**samples.rows[pos[0]], "distance_km": round(float(km[0]), 3)}
+
+
+def nearest_samples(samples, regions, lat, lon):
+    """nearest_sample for arrays of locations: one tree query per region present."""
+    out = [None] * len(lat)
+    regions = np.asarray(regions, dtype=object)
+    for region in set(regions.tolist()):
+        rows = np.flatnonzero(regions == region)
+        pos, km = samples.index.nearest(lat[rows], lon[rows], k=1, group=region or None)
+        for i, p, d in zip(rows, pos[:, 0], km[:, 0]):
+            out[i] = {**samples.rows[p], "distance_km": round(float(d), 3)}
+    return out
+
+
+def warmup_soil_models(m, batch_size):
+    """Synthetic rows through every forest and encoder /soil-predict uses."""
+    m.le_district.transform(m.le_district.classes_[:1])
+    m.le_region.transform(m.le_region.classes_[:1])
+    m.le_crop.inverse_transform([0])
+    X_user = np.zeros((batch_size, 4))
+    m.soil_model.predict(X_user)
+    m.crop_model.predict_proba(np.zeros((batch_size, 8)))
+    nearest_sample(m.samples, None, 19.0, 75.0)
+    if m.grid is not None and m.grid.cells:
+        district, region = next(iter(m.grid.cells))
+        lat0, lon0 = m.grid.cells[(district, region)][:2]
+        m.grid.lookup(district, region, lat0, lon0)
+
+
+# ---- Encoders & models trained by crop_system.py ----
+# Loaded on first use or by a background preload (MODEL_PRELOAD), each
+# artifact timed as its own startup phase; /readyz answers 503 until then
+soil = models.add("soil", lambda: load_soil_models(logger, models.timed), warmup=warmup_soil_models)
+models.preload_from_env()
+
+
+def encode_labels(encoder, values):
+    """
+    LabelEncoder.transform for a whole column at once (classes_ is sorted,
+    so a binary search); unseen labels encode as 0, as they always have.
+    """
+    classes = encoder.classes_
+    values = np.asarray(values, dtype=object)
+    pos = np.minimum(np.searchsorted(classes, values), len(classes) - 1)
+    return np.where(classes[pos] == values, pos, 0)
+
+
+# Heuristic statuses (tune thresholds as needed)
+def status_npk(x, low, high):
+    if x < low:
+        return "Low"
+    if x > high:
+        return "High"
+    return "Good"
+
+
+def status_ph(x):
+    if x < 6.0:
+        return "Acidic"
+    if x > 7.5:
+        return "Alkaline"
+    return "Optimal"
+
+
+def assess_soil(pred_N, pred_P, pred_K, pred_pH):
+    """Rounded values, statuses, score and advice for one set of soil predictions."""
+    status_N = status_npk(pred_N, low=20, high=60)
+    status_P = status_npk(pred_P, low=20, high=50)
+    status_K = status_npk(pred_K, low=40, high=120)
+    status_pH = status_ph(pred_pH)
+
+    # Rough score out of 100
+    score_components = [
+        1.0 if status_N == "Good" else 0.5 if status_N == "Low" else 0.7,
+        1.0 if status_P == "Good" else 0.5 if status_P == "Low" else 0.7,
+        1.0 if status_K == "Good" else 0.5 if status_K == "Low" else 0.7,
+        1.0 if status_pH == "Optimal" else 0.6
+    ]
+    score = int((sum(score_components) / len(score_components)) * 100)
+
+    # Simple text recommendations
+    recommendations = []
+    if status_N == "Low":
+        recommendations.append("Nitrogen is low. Apply N-rich fertilizer (e.g. Urea) as per local recommendation.")
+    if status_P == "Low":
+        recommendations.append("Phosphorus is low. Use SSP/DAP or P-rich fertilizers in basal dose.")
+    if status_K == "Low":
+        recommendations.append("Potassium is low. Apply MOP or other K-rich fertilizer.")
+    if status_pH == "Acidic":
+        recommendations.append("Soil is acidic. Consider liming and adding organic matter.")
+    if status_pH == "Alkaline":
+        recommendations.append("Soil is alkaline. Add organic matter and gypsum as needed.")
+
+    if not recommendations:
+        recommendations.append("Soil parameters look balanced. Maintain with organic compost and crop rotation.")
+
+    return {
+        "N": round(pred_N, 2),
+        "P": round(pred_P, 2),
+        "K": round(pred_K, 2),
+        "pH": round(pred_pH, 2),
+        "score": score,
+
+        "statuses": {
+            "N": status_N,
+            "P": status_P,
+            "K": status_K,
+            "pH": status_pH,
+        },
+        "recommendations": recommendations,
+    }
+
 
-LE_DISTRICT_PATH = os.path.join(PROJECTAVISHKAR_DIR, "le_district.pkl")
-LE_REGION_PATH = os.path.join(PROJECTAVISHKAR_DIR, "le_region.pkl")
-LE_CROP_PATH = os.path.join(PROJECTAVISHKAR_DIR, "le_crop.pkl")
-
-SOIL_N_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_N.pkl")
-SOIL_P_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_P.pkl")
-SOIL_K_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_K.pkl")
-SOIL_PH_PATH = os.path.join(PROJECTAVISHKAR_DIR, "soil_model_pH.pkl")
-CROP_MODEL_PATH = os.path.join(PROJECTAVISHKAR_DIR, "crop_model.pkl")
-
-# ---- Load encoders & models trained by crop_system.py ----
-try:
-    le_district = joblib.load(LE_DISTRICT_PATH)
-    le_region = joblib.load(LE_REGION_PATH)
-    le_crop = joblib.load(LE_CROP_PATH)
-
-    soil_model_N = joblib.load(SOIL_N_PATH)
-    soil_model_P = joblib.load(SOIL_P_PATH)
-    soil_model_K = joblib.load(SOIL_K_PATH)
-    soil_model_pH = joblib.load(SOIL_PH_PATH)
-
-    crop_model = joblib.load(CROP_MODEL_PATH)
-
-    print("[SOIL-API] Loaded encoders, soil models, and crop model successfully.")
-except Exception as e:
-    print("[SOIL-API][ERROR] Failed to load models or encoders:", e)
-    traceback.print_exc()
-    le_district = None
-    le_region = None
-    le_crop = None
-    soil_model_N = None
-    soil_model_P = None
-    soil_model_K = None
-    soil_model_pH = None
-    crop_model = None
+def top_crops(m, probs, k=3):
+    """Top-k crop names and scores (percent) for each row of crop_model probabilities."""
+    probs = np.atleast_2d(probs)
+    top_idx = np.argsort(probs, axis=1)[:, ::-1][:, :k]
+    names = m.le_crop.classes_[top_idx]
+    scores = np.take_along_axis(probs, top_idx, axis=1) * 100.0
+    return [
+        [{"name": name, "score": round(float(score), 2)} for name, score in zip(row_names, row_scores)]
+        for row_names, row_scores in zip(names.tolist(), scores)
+    ]
+
+
+@app.route("/healthz")
+def healthz():
+    return jsonify(models.health())
+
+
+@app.route("/readyz")
+def readyz():
+    body, status = models.readiness()
+    return jsonify(body), status
 
 
 @app.route("/")
 def home():
     """Health check"""
-    ready = all(
-        m is not None
-        for m in [
-            le_district,
-            le_region,
-            le_crop,
-            soil_model_N,
-            soil_model_P,
-            soil_model_K,
-            soil_model_pH,
-            crop_model,
-        ]
-    )
-
     return jsonify({
         "message": "Soil Prediction API is running!",
-        "models_loaded": ready,
+        "models_loaded": soil.loaded,
+        "soil_model": soil.get_or_none().soil_model_kind if soil.loaded else None,
         "endpoints": {
-            "POST /soil-predict": "Predict N, P, K, pH and simple soil score from location"
+            "GET /healthz": "Process is up",
+            "GET /readyz": "Models loaded (503 until then)",
+            "POST /soil-predict": "Predict N, P, K, pH and simple soil score from location",
+            "POST /soil-predict/batch": "Many locations (JSON records or CSV), streamed as NDJSON"
         },
     })
 
@@ -89,21 +229,11 @@ def soil_predict():
       "longitude": 77.56
     }
     """
-    if not all(
-        m is not None
-        for m in [
-            le_district,
-            le_region,
-            le_crop,
-            soil_model_N,
-            soil_model_P,
-            soil_model_K,
-            soil_model_pH,
-            crop_model,
-        ]
-    ):
+    m = soil.get_or_none()
+    if m is None:
         return jsonify({"error": "Models or encoders not loaded on server"}), 500
 
+    timer = RequestTimer()
     try:
         data = request.get_json(force=True) or {}
         district = (data.get("district") or "").strip()
@@ -119,129 +249,55 @@ def soil_predict():
             lon_f = float(longitude)
         except ValueError:
             return jsonify({"error": "latitude and longitude must be numbers"}), 400
+        # float() accepts "nan" and "inf", which no grid or tree lookup can place
+        if not (math.isfinite(lat_f) and math.isfinite(lon_f)):
+            return jsonify({"error": "latitude and longitude must be finite numbers"}), 400
+        timer.mark("decode")
 
         # Encode district & region like in crop_system.py
-        try:
-            dist_enc = int(le_district.transform([district])[0])
-        except Exception:
-            dist_enc = 0
-
-        try:
-            reg_enc = int(le_region.transform([region])[0])
-        except Exception:
-            reg_enc = 0
-
-        # Feature order: ["Latitude", "Longitude", "District_enc", "Region_enc"]
-        X_user = np.array([[lat_f, lon_f, dist_enc, reg_enc]])
-
-        # Predict soil parameters
-        pred_N = float(soil_model_N.predict(X_user)[0])
-        pred_P = float(soil_model_P.predict(X_user)[0])
-        pred_K = float(soil_model_K.predict(X_user)[0])
-        pred_pH = float(soil_model_pH.predict(X_user)[0])
-
-        # Heuristic statuses (tune thresholds as needed)
-        def status_npk(x, low, high):
-            if x < low:
-                return "Low"
-            if x > high:
-                return "High"
-            return "Good"
-
-        def status_ph(x):
-            if x < 6.0:
-                return "Acidic"
-            if x > 7.5:
-                return "Alkaline"
-            return "Optimal"
-
-        status_N = status_npk(pred_N, low=20, high=60)
-        status_P = status_npk(pred_P, low=20, high=50)
-        status_K = status_npk(pred_K, low=40, high=120)
-        status_pH = status_ph(pred_pH)
-
-        # Rough score out of 100
-        score_components = [
-            1.0 if status_N == "Good" else 0.5 if status_N == "Low" else 0.7,
-            1.0 if status_P == "Good" else 0.5 if status_P == "Low" else 0.7,
-            1.0 if status_K == "Good" else 0.5 if status_K == "Low" else 0.7,
-            1.0 if status_pH == "Optimal" else 0.6
-        ]
-        score = int((sum(score_components) / len(score_components)) * 100)
-
-        # Simple text recommendations
-        recommendations = []
-        if status_N == "Low":
-            recommendations.append("Nitrogen is low. Apply N-rich fertilizer (e.g. Urea) as per local recommendation.")
-        if status_P == "Low":
-            recommendations.append("Phosphorus is low. Use SSP/DAP or P-rich fertilizers in basal dose.")
-        if status_K == "Low":
-            recommendations.append("Potassium is low. Apply MOP or other K-rich fertilizer.")
-        if status_pH == "Acidic":
-            recommendations.append("Soil is acidic. Consider liming and adding organic matter.")
-        if status_pH == "Alkaline":
-            recommendations.append("Soil is alkaline. Add organic matter and gypsum as needed.")
-
-        if not recommendations:
-            recommendations.append("Soil parameters look balanced. Maintain with organic compost and crop rotation.")
+        dist_enc = int(encode_labels(m.le_district, [district])[0])
+        reg_enc = int(encode_labels(m.le_region, [region])[0])
+
+        # Inside a known district's grid: precomputed soil values and crop
+        # probabilities, no model call
+        grid_row = m.grid.lookup(district, region, lat_f, lon_f) if m.grid is not None else None
+        if grid_row is not None:
+            pred_N, pred_P, pred_K, pred_pH = (float(v) for v in grid_row[:N_SOIL])
+            timer.mark("grid")
+        else:
+            # Feature order: ["Latitude", "Longitude", "District_enc", "Region_enc"]
+            X_user = np.array([[lat_f, lon_f, dist_enc, reg_enc]])
+            timer.mark("preprocess")
+
+            # Predict soil parameters, all four in one call
+            pred_N, pred_P, pred_K, pred_pH = (float(v) for v in m.soil_model.predict(X_user)[0])
+            timer.mark("inference")
+
+        response = assess_soil(pred_N, pred_P, pred_K, pred_pH)
+        score = response["score"]
 
         # Crop recommendations using the trained crop model
-        crop_feature_cols = [
-            "N",
-            "P",
-            "K",
-            "pH",
-            "Latitude",
-            "Longitude",
-            "District_enc",
-            "Region_enc",
-        ]
-
-        X_user_crop = np.array([
-            [
-                pred_N,
-                pred_P,
-                pred_K,
-                pred_pH,
-                lat_f,
-                lon_f,
-                dist_enc,
-                reg_enc,
-            ]
-        ])
-
         try:
-            probs = crop_model.predict_proba(X_user_crop)[0]
-            top_idx = np.argsort(probs)[::-1][:3]
-            top_crops = [le_crop.inverse_transform([i])[0] for i in top_idx]
-            top_scores = [float(probs[i] * 100.0) for i in top_idx]
-            crop_recommendations = [
-                {"name": name, "score": round(score, 2)}
-                for name, score in zip(top_crops, top_scores)
-            ]
+            if grid_row is not None:
+                probs = grid_row[N_SOIL:]
+            else:
+                # Feature order: ["N", "P", "K", "pH", "Latitude", "Longitude", "District_enc", "Region_enc"]
+                X_user_crop = np.array([[pred_N, pred_P, pred_K, pred_pH, lat_f, lon_f, dist_enc, reg_enc]])
+                probs = m.crop_model.predict_proba(X_user_crop)[0]
+            crop_recommendations = top_crops(m, probs)[0]
         except Exception as e:
-            print("[SOIL-API][WARN] Failed to compute crop recommendations:", e)
+            log_event(logger, "failed to compute crop recommendations", level=logging.WARNING, error=str(e))
             crop_recommendations = []
+        timer.mark("crop_inference")
+
+        # Measured soil at the closest sampled location, next to the prediction
+        sample = nearest_sample(m.samples, region, lat_f, lon_f)
+        timer.mark("nearest_sample")
 
-        # Build main response
-        response = {
-            "N": round(pred_N, 2),
-            "P": round(pred_P, 2),
-            "K": round(pred_K, 2),
-            "pH": round(pred_pH, 2),
-            "score": score,
-
-            "statuses": {
-                "N": status_N,
-                "P": status_P,
-                "K": status_K,
-                "pH": status_pH,
-            },
-            "recommendations": recommendations,
-            "crop_recommendations": crop_recommendations,
-        }
-
-        # --- Append this prediction to simple history log ---
+        response["crop_recommendations"] = crop_recommendations
+        response["nearest_sample"] = sample
+
+        # --- Record this prediction and attach the place's history ---
         try:
             entry = {
                 "timestamp": datetime.utcnow().isoformat() + "Z",
@@ -255,104 +311,196 @@ def soil_predict():
                 "K": response["K"],
                 "pH": response["pH"],
             }
-
-            with open(HISTORY_PATH, "a", encoding="utf-8") as f:
-                f.write(json.dumps(entry) + "\n")
-
-            # Read recent history for this location and neighbor stats
-            history: list[dict] = []
-            neighbor_scores: list[float] = []
-            if os.path.exists(HISTORY_PATH):
-                with open(HISTORY_PATH, "r", encoding="utf-8") as f:
-                    lines = f.readlines()[-300:]
-
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        rec = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-
-                    # Match by same region/district or nearby coordinates
-                    same_place = False
-                    same_district = False
-                    same_region = False
-                    try:
-                        if district and rec.get("district") == district:
-                            same_district = True
-                            same_place = True
-                        elif region and rec.get("region") == region:
-                            same_region = True
-                            same_place = True
-                        else:
-                            lat2 = float(rec.get("latitude", 0.0))
-                            lon2 = float(rec.get("longitude", 0.0))
-                            if abs(lat2 - lat_f) <= 0.02 and abs(lon2 - lon_f) <= 0.02:
-                                same_place = True
-                    except Exception:
-                        same_place = False
-
-                    if same_place:
-                        history.append(
-                            {
-                                "timestamp": rec.get("timestamp"),
-                                "score": rec.get("score"),
-                                "N": rec.get("N"),
-                                "P": rec.get("P"),
-                                "K": rec.get("K"),
-                                "pH": rec.get("pH"),
-                            }
-                        )
-
-                    # Collect neighbor scores (prefer same district, else same region)
-                    try:
-                        sc = float(rec.get("score"))
-                    except Exception:
-                        sc = None
-                    if sc is not None:
-                        if same_district:
-                            neighbor_scores.append(sc)
-                        elif not district and same_region:
-                            neighbor_scores.append(sc)
-
-            # Sort by timestamp (oldest first) and limit
-            def _ts_key(item: dict):
-                try:
-                    return item.get("timestamp") or ""
-                except Exception:
-                    return ""
-
-            history_sorted = sorted(history, key=_ts_key)[-10:]
-            response["history"] = history_sorted
-
-            # Neighbor comparison stats
-            if neighbor_scores:
-                try:
-                    avg_score = float(sum(neighbor_scores) / len(neighbor_scores))
-                    # percentile: percentage of neighbors with score <= current score
-                    count_le = sum(1 for s in neighbor_scores if s <= score)
-                    percentile = float((count_le / len(neighbor_scores)) * 100.0)
-                    response["neighbor_stats"] = {
-                        "avg_score": round(avg_score, 2),
-                        "count": len(neighbor_scores),
-                        "percentile": round(percentile, 2),
-                    }
-                except Exception as e:
-                    print("[SOIL-API][WARN] Failed to compute neighbor stats:", e)
+            history_writer.submit(entry)
+
+            # Entries still queued for the writer (this one included) count too
+            with history_writer.pending() as pending:
+                # Neighbor comparison stats (same district, else same region)
+                stats = neighbor_stats.stats(district, region, score, pending)
+
+            # Same district, same region or nearby coordinates; indexed, over all records
+            response["history"] = history.place_history(
+                district, region, lat_f, lon_f, limit=10, pending=pending
+            )
+
+            if stats is not None:
+                count, avg_score, count_le = stats
+                # percentile: percentage of neighbors with score <= current score
+                response["neighbor_stats"] = {
+                    "avg_score": round(avg_score, 2),
+                    "count": count,
+                    "percentile": round(count_le / count * 100.0, 2),
+                }
 
         except Exception as e:
-            print("[SOIL-API][WARN] Failed to log or attach history:", e)
-
-        return jsonify(response)
+            log_event(logger, "failed to log or attach history", level=logging.WARNING, error=str(e))
+        timer.mark("history")
+
+        result = jsonify(response)
+        timer.mark("serialize")
+        log_event(
+            logger,
+            "request",
+            sampled=True,
+            path="/soil-predict",
+            district=district,
+            region=region,
+            score=score,
+            source="grid" if grid_row is not None else "model",
+            **timer.fields(),
+        )
+        return result
 
     except Exception as e:
-        print("[SOIL-API][ERROR]", str(e))
-        traceback.print_exc()
+        log_event(logger, "prediction failed", level=logging.ERROR, exc_info=True)
         return jsonify({"error": f"Prediction failed: {str(e)}"}), 500
 
 
+BATCH_MAX_RECORDS = int(os.environ.get("SOIL_BATCH_MAX_RECORDS", "10000"))
+BATCH_CHUNK = int(os.environ.get("SOIL_BATCH_CHUNK", "1000"))
+
+
+def read_batch_records():
+    """
+    Records from a JSON body ({"records": [...]} or a bare list) or a CSV
+    upload (form field "file", or a text/csv body). CSV headers are
+    matched case-insensitively, so crop.csv-style columns work too.
+    """
+    upload = request.files.get("file")
+    if upload is not None or (request.mimetype or "").endswith("csv"):
+        raw = upload.read() if upload is not None else request.get_data()
+        reader = csv.DictReader(io.StringIO(raw.decode("utf-8-sig")))
+        return [{(k or "").strip().lower(): v for k, v in row.items()} for row in reader]
+    # silent: malformed JSON is the endpoint's JSON 400, not werkzeug's HTML page
+    data = request.get_json(force=True, silent=True)
+    if data is None:
+        raise ValueError("body is not valid JSON")
+    if isinstance(data, dict):
+        data = data.get("records")
+    if not isinstance(data, list):
+        raise ValueError('expected {"records": [...]}, a JSON list or a CSV upload')
+    return data
+
+
+def predict_batch_chunk(m, records):
+    """
+    NDJSON lines for one chunk of records: the whole chunk is encoded at
+    once and goes through the soil model and crop_model in one call each
+    (grid lookups aside).
+    """
+    lines = [None] * len(records)
+    valid, lat, lon, districts, regions = [], [], [], [], []
+    for i, rec in enumerate(records):
+        try:
+            lat_f = float(rec.get("latitude"))
+            lon_f = float(rec.get("longitude"))
+        except (TypeError, ValueError, AttributeError):
+            lines[i] = {"error": "latitude and longitude are required and must be numbers"}
+            continue
+        if not (math.isfinite(lat_f) and math.isfinite(lon_f)):
+            lines[i] = {"error": "latitude and longitude must be finite numbers"}
+            continue
+        district = rec.get("district") or ""
+        region = rec.get("region") or ""
+        if not isinstance(district, str) or not isinstance(region, str):
+            lines[i] = {"error": "district and region must be strings"}
+            continue
+        valid.append(i)
+        lat.append(lat_f)
+        lon.append(lon_f)
+        districts.append(district.strip())
+        regions.append(region.strip())
+
+    if not valid:
+        return lines
+    try:
+        lat = np.array(lat)
+        lon = np.array(lon)
+        # Feature order: ["Latitude", "Longitude", "District_enc", "Region_enc"]
+        X = np.column_stack([
+            lat, lon, encode_labels(m.le_district, districts), encode_labels(m.le_region, regions),
+        ])
+        # Records inside a district's precomputed grid skip the models, like
+        # single requests; the rest go through each model in one call
+        grid_rows = [
+            m.grid.lookup(d, r, la, lo) if m.grid is not None else None
+            for d, r, la, lo in zip(districts, regions, lat, lon)
+        ]
+        live = [j for j, row in enumerate(grid_rows) if row is None]
+        on_grid = [j for j, row in enumerate(grid_rows) if row is not None]
+        soil_pred = np.empty((len(valid), N_SOIL))
+        probs = np.empty((len(valid), len(m.le_crop.classes_)))
+        if on_grid:
+            grid_values = np.array([grid_rows[j] for j in on_grid])
+            soil_pred[on_grid] = grid_values[:, :N_SOIL]
+            probs[on_grid] = grid_values[:, N_SOIL:]
+        if live:
+            soil_pred[live] = m.soil_model.predict(X[live])
+            probs[live] = m.crop_model.predict_proba(np.column_stack([soil_pred[live], X[live]]))
+        crops = top_crops(m, probs)
+        samples = nearest_samples(m.samples, regions, lat, lon)
+        for j, i in enumerate(valid):
+            report = assess_soil(*(float(v) for v in soil_pred[j]))
+            report["crop_recommendations"] = crops[j]
+            report["nearest_sample"] = samples[j]
+            lines[i] = {
+                "district": districts[j],
+                "region": regions[j],
+                "latitude": float(lat[j]),
+                "longitude": float(lon[j]),
+                **report,
+            }
+    except Exception as e:
+        # Records that failed validation keep their own error
+        log_event(logger, "batch prediction failed", level=logging.ERROR, exc_info=True)
+        for i in valid:
+            lines[i] = {"error": f"Prediction failed: {e}"}
+    return lines
+
+
+@app.route("/soil-predict/batch", methods=["POST"])
+def soil_predict_batch():
+    """
+    Many (district, region, latitude, longitude) records in one request,
+    e.g. a village survey. Streams NDJSON: one line per record, in input
+    order, each with "index" and either the /soil-predict fields (without
+    history or neighbor stats, and nothing is added to the history) or
+    "error". Records go through the models SOIL_BATCH_CHUNK at a time.
+    """
+    m = soil.get_or_none()
+    if m is None:
+        return jsonify({"error": "Models or encoders not loaded on server"}), 500
+
+    timer = RequestTimer()
+    try:
+        records = read_batch_records()
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Could not read records: {e}"}), 400
+    if len(records) > BATCH_MAX_RECORDS:
+        return jsonify({"error": f"At most {BATCH_MAX_RECORDS} records per request"}), 413
+    timer.mark("decode")
+
+    def generate():
+        errors = 0
+        for start in range(0, len(records), BATCH_CHUNK):
+            lines = predict_batch_chunk(m, records[start:start + BATCH_CHUNK])
+            for i, line in enumerate(lines, start=start):
+                errors += "error" in line
+                yield json.dumps({"index": i, **line}) + "\n"
+        timer.mark("inference")
+        log_event(
+            logger,
+            "request",
+            sampled=True,
+            path="/soil-predict/batch",
+            records=len(records),
+            errors=errors,
+            **timer.fields(),
+        )
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 if __name__ == "__main__":
     # Run this separately from server.py, on a different port
     app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""
+Checks for the SQLite prediction history and its background writer
+(history_store.py), on a temporary database.
+
+Run with:  python -m pytest test_history_store.py
+"""
+import json
+import os
+import random
+import sys
+import time
+
+import pytest
+
+# history_store imports shared modules that live next to the groundwater model
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MODEL"))
+from history_store import HISTORY_FIELDS, HistoryStore, HistoryWriter
+from neighbor_stats import NeighborStats
+from service_logging import get_logger
+from spatial_index import CELL_DEG
+
+logger = get_logger("test-history-store")
+
+
+def entry(i, district="Achalpur", region="Vidarbha", lat=21.3, lon=77.56, score=75):
+    return {
+        "timestamp": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z",
+        "district": district,
+        "region": region,
+        "latitude": lat,
+        "longitude": lon,
+        "score": score,
+        "N": 40.0,
+        "P": 30.0,
+        "K": 80.0,
+        "pH": 6.5,
+    }
+
+
+def jsonl_scan(records, district, region, lat, lon, limit=10):
+    """The matching soil_server.py did over soil_history.jsonl before the store."""
+    history = []
+    for rec in records:
+        if (
+            (district and rec.get("district") == district)
+            or (region and rec.get("region") == region)
+            or (abs(float(rec["latitude"]) - lat) <= 0.02 and abs(float(rec["longitude"]) - lon) <= 0.02)
+        ):
+            history.append({f: rec.get(f) for f in HISTORY_FIELDS})
+    return sorted(history, key=lambda item: item.get("timestamp") or "")[-limit:]
+
+
+def synthetic_history(n=300, seed=0):
+    """Records around a few places, many of them right at the CELL_DEG edge."""
+    rng = random.Random(seed)
+    places = [(21.3, 77.56), (20.0, 76.0), (19.99, 75.01)]
+    offsets = [0.0, CELL_DEG, -CELL_DEG, CELL_DEG * 0.9999, CELL_DEG * 1.0001, 0.005, 0.03]
+    records = []
+    for i in range(n):
+        lat, lon = rng.choice(places)
+        records.append(entry(
+            i,
+            district=rng.choice(["Achalpur", "Akola", "Amravati", ""]),
+            region=rng.choice(["Vidarbha", "Marathwada", ""]),
+            lat=lat + rng.choice(offsets) * rng.choice([1, -1]),
+            lon=lon + rng.choice(offsets) * rng.choice([1, -1]),
+            score=rng.randint(40, 100),
+        ))
+    # Unique timestamps, shuffled, so "latest 10" is well defined but not insertion order
+    rng.shuffle(records)
+    return records
+
+
+QUERIES = [
+    (district, region, lat, lon)
+    for district in ("Achalpur", "Akola", "", None)
+    for region in ("Vidarbha", "Konkan", "")
+    for lat, lon in ((21.3, 77.56), (21.32, 77.58), (20.0, 76.0), (19.99, 75.01), (18.0, 73.0))
+]
+
+
+def test_place_history_matches_jsonl_scan(tmp_path):
+    records = synthetic_history()
+    path = tmp_path / "soil_history.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+        f.write("not json\n")
+    store = HistoryStore(str(tmp_path / "history.db"), import_jsonl=str(path))
+    try:
+        assert store.count() == len(records)
+        for district, region, lat, lon in QUERIES:
+            assert store.place_history(district, region, lat, lon) == jsonl_scan(records, district, region, lat, lon)
+    finally:
+        store.close()
+
+
+def test_place_history_merges_pending_once(store):
+    records = synthetic_history()
+    newest = sorted(records, key=lambda rec: rec["timestamp"])
+    store.add_many(newest[:-10])
+    # The writer may have written some pending entries since they were read:
+    # the newest 20 are pending, and 10 of them are already in the database
+    pending = newest[-20:]
+    for district, region, lat, lon in QUERIES:
+        merged = store.place_history(district, region, lat, lon, pending=pending)
+        assert merged == jsonl_scan(records, district, region, lat, lon)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def test_writer_batches_and_flushes_on_close(store):
+    writer = HistoryWriter(store, logger, batch_size=3, interval_s=5.0)
+    for i in range(7):
+        assert writer.submit(entry(i))
+
+    # Two full batches go at once; the last entry waits for the interval
+    wait_for(lambda: writer.stats()["written"] == 6)
+    assert store.count() == 6
+    with writer.pending() as pending:
+        assert [e["timestamp"] for e in pending] == [entry(6)["timestamp"]]
+
+    writer.close()
+    assert store.count() == 7
+    assert writer.stats() == {"pending": 0, "written": 7, "dropped": 0}
+
+
+def test_writer_drops_beyond_max_pending(store):
+    writer = HistoryWriter(store, logger, batch_size=100, interval_s=5.0, max_pending=2)
+    assert writer.submit(entry(0))
+    assert writer.submit(entry(1))
+    assert not writer.submit(entry(2))
+    assert writer.stats()["dropped"] == 1
+    writer.close()
+    assert store.count() == 2
+
+
+def test_writer_retries_a_failed_write(store, monkeypatch):
+    add_many = store.add_many
+    failures = []
+
+    def flaky(entries):
+        if not failures:
+            failures.append(len(entries))
+            raise OSError("disk full")
+        add_many(entries)
+
+    monkeypatch.setattr(store, "add_many", flaky)
+    flushed = []
+    writer = HistoryWriter(store, logger, batch_size=2, interval_s=0.01, on_flush=flushed.append)
+    writer.submit(entry(0))
+    writer.submit(entry(1))
+
+    wait_for(lambda: writer.stats()["written"] == 2)
+    writer.close()
+    assert failures == [2]
+    assert store.count() == 2
+    # on_flush only after the write that succeeded
+    assert flushed == [None]
+
+
+def test_writer_fetches_outside_its_lock(store):
+    seen = {}
+
+    def fetch():
+        seen["fetch_locked"] = writer._lock.locked()
+        return "rows"
+
+    def on_flush(fetched):
+        seen["fetched"] = fetched
+        seen["on_flush_locked"] = writer._lock.locked()
+
+    writer = HistoryWriter(store, logger, batch_size=1, interval_s=5.0, fetch=fetch, on_flush=on_flush)
+    writer.submit(entry(0))
+    writer.close()
+    assert seen == {"fetch_locked": False, "fetched": "rows", "on_flush_locked": True}
+
+
+def test_pending_and_stats_never_double_count(store):
+    stats = NeighborStats(store, logger)
+    writer = HistoryWriter(
+        store, logger, batch_size=4, interval_s=0.001, fetch=stats.new_rows, on_flush=stats.apply
+    )
+    # Each entry is either still pending or already in the stats, never both
+    for i in range(200):
+        writer.submit(entry(i))
+        with writer.pending() as pending:
+            assert stats.stats("Achalpur", "Vidarbha", 75, pending)[0] == i + 1
+    writer.close()
+
+    assert store.count() == 200
+    assert stats.stats("Achalpur", "Vidarbha", 75)[0] == 200
@@ -0,0 +1,201 @@
+"""
+Checks that neighbor_stats.py agrees with brute-force count, average and
+percentile over the history rows, on a temporary database.
+
+Run with:  python -m pytest test_neighbor_stats.py
+"""
+import json
+import os
+import random
+import sys
+
+import pytest
+
+# neighbor_stats imports shared modules that live next to the groundwater model
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MODEL"))
+from history_store import HistoryStore
+from neighbor_stats import MAX_SCORE, NeighborStats, ScoreHistogram
+from service_logging import get_logger
+
+logger = get_logger("test-neighbor-stats")
+
+DISTRICTS = ["Achalpur", "Akola", "Amravati", "Latur", ""]
+REGIONS = ["Vidarbha", "Marathwada", ""]
+
+
+def random_entries(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "timestamp": f"2024-01-01T00:00:{i:05d}Z",
+            "district": rng.choice(DISTRICTS),
+            "region": rng.choice(REGIONS),
+            "latitude": 21.0,
+            "longitude": 77.0,
+            # Scores as soil_server.py computes them, plus a few unscored rows
+            "score": rng.choice([rng.randint(40, 100), rng.randint(0, 100), None]),
+        }
+        for i in range(n)
+    ]
+
+
+def brute_force(entries, district, region, score):
+    """neighbor_stats the way soil_server.py computed it over the raw rows."""
+    field, name = ("district", district) if district else ("region", region)
+    if not name:
+        return None
+    scores = [e["score"] for e in entries if e.get(field) == name and e["score"] is not None]
+    if not scores:
+        return None
+    return len(scores), sum(scores) / len(scores), sum(1 for s in scores if s <= score)
+
+
+def assert_matches(stats, entries, pending=()):
+    for district in DISTRICTS + ["Nowhere"]:
+        for region in REGIONS + ["Konkan"]:
+            for score in (0, 55, 75, 87, 100):
+                got = stats.stats(district, region, score, pending)
+                want = brute_force(list(entries) + list(pending), district, region, score)
+                if want is None:
+                    assert got is None
+                else:
+                    assert got[0] == want[0] and got[2] == want[2]
+                    assert got[1] == pytest.approx(want[1])
+
+
+def summary(stats):
+    return {key: (h.count, h.total, h.counts()) for key, h in stats.groups.items()}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    yield store
+    store.close()
+
+
+def test_histogram_matches_brute_force():
+    rng = random.Random(1)
+    scores = [rng.randint(0, MAX_SCORE) for _ in range(500)]
+    hist = ScoreHistogram()
+    for s in scores:
+        hist.add(s)
+
+    assert hist.count == len(scores)
+    assert hist.total == sum(scores)
+    for s in range(-1, MAX_SCORE + 2):
+        assert hist.count_le(s) == sum(1 for x in scores if x <= s)
+    assert hist.counts() == [scores.count(s) for s in range(MAX_SCORE + 1)]
+
+    copy = ScoreHistogram.from_counts(hist.counts(), hist.total)
+    assert (copy.count, copy.total, copy.tree) == (hist.count, hist.total, hist.tree)
+
+
+def test_rebuild_and_sync_match_brute_force(store):
+    entries = random_entries(2000)
+    store.add_many(entries[:1500])
+    stats = NeighborStats(store, logger)
+    assert stats.last_id == 1500
+    assert_matches(stats, entries[:1500])
+
+    # Rows written later (by any process) come in through sync()
+    store.add_many(entries[1500:])
+    stats.sync()
+    assert stats.last_id == 2000
+    assert_matches(stats, entries)
+    assert summary(stats) == summary(NeighborStats(store, logger))
+
+
+def test_apply_skips_rows_already_applied(store):
+    store.add_many(random_entries(100))
+    stats = NeighborStats(store, logger)
+    before = summary(stats)
+    stats.apply(store.rows_since(50))
+    assert summary(stats) == before
+
+
+def test_pending_entries_are_counted(store):
+    entries = random_entries(600)
+    store.add_many(entries[:500])
+    stats = NeighborStats(store, logger)
+    assert_matches(stats, entries[:500], pending=entries[500:])
+
+
+def test_snapshot_round_trip(store, tmp_path, monkeypatch):
+    path = str(tmp_path / "stats.json")
+    entries = random_entries(1000)
+    store.add_many(entries[:800])
+    stats = NeighborStats(store, logger, snapshot_path=path)
+    stats.snapshot()
+    store.add_many(entries[800:])
+
+    # A restart loads the snapshot and replays only the rows after it
+    replayed = []
+    rows_since = store.rows_since
+    monkeypatch.setattr(store, "score_counts", lambda: pytest.fail("rebuilt instead of loading the snapshot"))
+    monkeypatch.setattr(store, "rows_since", lambda last_id: replayed.append(last_id) or rows_since(last_id))
+    restarted = NeighborStats(store, logger, snapshot_path=path)
+    assert replayed == [800]
+    assert restarted.last_id == 1000
+    assert_matches(restarted, entries)
+
+
+def test_snapshot_after_every_n_rows(store, tmp_path):
+    path = str(tmp_path / "stats.json")
+    stats = NeighborStats(store, logger, snapshot_path=path, snapshot_every=100)
+    store.add_many(random_entries(99))
+    stats.sync()
+    stats.maybe_snapshot()
+    assert not os.path.exists(path)
+
+    store.add_many(random_entries(1, seed=1))
+    stats.sync()
+    stats.maybe_snapshot()
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["last_id"] == 100
+
+
+def test_snapshot_from_another_database_is_rejected(store, tmp_path):
+    path = str(tmp_path / "stats.json")
+    other = HistoryStore(str(tmp_path / "other.db"))
+    try:
+        other.add_many(random_entries(50, seed=2))
+        NeighborStats(other, logger, snapshot_path=path).snapshot()
+    finally:
+        other.close()
+
+    entries = random_entries(300)
+    store.add_many(entries)
+    stats = NeighborStats(store, logger, snapshot_path=path)
+    assert stats.last_id == 300
+    assert_matches(stats, entries)
+
+
+def test_snapshot_ahead_of_a_recreated_database_is_rejected(tmp_path):
+    path = str(tmp_path / "stats.json")
+    db = str(tmp_path / "history.db")
+    store = HistoryStore(db)
+    store.add_many(random_entries(500))
+    NeighborStats(store, logger, snapshot_path=path).snapshot()
+    store.close()
+
+    # Same path, fewer rows: the snapshot's last_id is past the end
+    os.remove(db)
+    entries = random_entries(200, seed=3)
+    store = HistoryStore(db)
+    try:
+        store.add_many(entries)
+        stats = NeighborStats(store, logger, snapshot_path=path)
+        assert stats.last_id == 200
+        assert_matches(stats, entries)
+    finally:
+        store.close()
+
+
+def test_unreadable_snapshot_falls_back_to_rebuild(store, tmp_path):
+    path = str(tmp_path / "stats.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    entries = random_entries(100)
+    store.add_many(entries)
+    assert_matches(NeighborStats(store, logger, snapshot_path=path), entries)
@@ -0,0 +1,183 @@
+"""
+Result cache for disease-detection uploads.
+
+Farmers resubmit the same photo (retries, sharing from the gallery), so
+server.py looks an upload up before doing any work:
+
+  1. content key: blake2b of the raw bytes. A byte-identical upload is
+     answered without decoding the image or running the model.
+  2. optional disk tier: a SQLite file holding the same content keys, so
+     answers survive restarts and the memory tier can stay small.
+  3. optional perceptual hash (dHash) of the decoded image: a resized or
+     re-compressed copy of a photo lands within a few bits of the
+     original and reuses its answer without running the model.
+
+The memory tiers reuse MODEL/cache.py (LRU + TTL). Each loaded classifier
+builds its own UploadCache, so they never outlive its model. Disk rows are
+tagged with a digest of the model file this process loaded, and rows from
+another model are ignored after a restart.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from cache import PredictionCache
+
+
+def content_key(data):
+    """Hash of the raw upload bytes."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def perceptual_hash(img, hash_size=8):
+    """
+    dHash of a PIL image: shrink to (hash_size + 1) x hash_size greyscale
+    and record whether each pixel is brighter than its right neighbour.
+    Returns a hash_size**2-bit int.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _file_tag(path, block=1 << 20):
+    """Content digest of the model file, or "missing"."""
+    h = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(block), b""):
+                h.update(chunk)
+    except OSError:
+        return "missing"
+    return h.hexdigest()
+
+
+class DiskTier:
+    """Bounded SQLite key -> JSON store; oldest rows are pruned past max_entries."""
+
+    def __init__(self, path, model_path, max_entries=100000):
+        self.path = path
+        self.model_path = model_path
+        # Read once: the tag names the model this process loaded
+        self.model_tag = _file_tag(model_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key BLOB PRIMARY KEY, model TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE key = ? AND model = ?",
+                (key, self.model_tag),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, model, value, created) VALUES (?, ?, ?, ?)",
+                (key, self.model_tag, json.dumps(value), time.time()),
+            )
+            self._writes += 1
+            # Prune in bulk now and then rather than on every insert
+            if self._writes % 1000 == 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY created DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class UploadCache:
+    def __init__(self, model_path, max_size=1000, ttl_s=86400.0, disk_path=None,
+                 disk_max_entries=100000, phash=False, phash_distance=4):
+        self.exact = PredictionCache(max_size, ttl_s)
+        self.disk = DiskTier(disk_path, model_path, disk_max_entries) if disk_path else None
+        self.phash = PredictionCache(max_size, ttl_s) if phash else None
+        self.phash_distance = phash_distance
+
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0, "phash": 0}
+        self.misses = 0
+
+    def _count(self, source):
+        with self._lock:
+            if source is None:
+                self.misses += 1
+            else:
+                self.hits[source] += 1
+
+    def lookup(self, key):
+        """Content-key lookup, before decoding. Returns (result, source) or (None, None)."""
+        result = self.exact.get(key)
+        if result is not None:
+            return result, "memory"
+        if self.disk is not None:
+            result = self.disk.get(key)
+            if result is not None:
+                self.exact.put(key, result)
+                return result, "disk"
+        return None, None
+
+    def lookup_similar(self, img):
+        """
+        Perceptual lookup on the decoded image. Returns (result, source, phash);
+        phash is None when the option is off.
+        """
+        if self.phash is None:
+            return None, None, None
+        h = perceptual_hash(img)
+        result = self.phash.get(h)
+        if result is None and self.phash_distance > 0:
+            for other in reversed(self.phash.keys()):
+                if (h ^ other).bit_count() <= self.phash_distance:
+                    result = self.phash.get(other)
+                    break
+        return result, ("phash" if result is not None else None), h
+
+    def record(self, source):
+        """Count one request's outcome (source None = computed by the model)."""
+        self._count(source)
+
+    def put(self, key, result, phash=None):
+        self.exact.put(key, result)
+        if self.disk is not None:
+            self.disk.put(key, result)
+        if phash is not None and self.phash is not None:
+            self.phash.put(phash, result)
+
+    def stats(self):
+        with self._lock:
+            hits = dict(self.hits)
+            misses = self.misses
+        lookups = sum(hits.values()) + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(sum(hits.values()) / lookups, 4) if lookups else 0.0,
+            "memory": self.exact.stats(),
+            "disk": {"path": self.disk.path, "size": self.disk.size()} if self.disk else None,
+            "phash": {**self.phash.stats(), "distance": self.phash_distance} if self.phash else None,
+        }
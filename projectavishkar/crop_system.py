@@ -2,12 +2,35 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+import sys
 from datetime import datetime
 
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.metrics import accuracy_score
+from sklearn.metrics import accuracy_score, mean_absolute_error, r2_score
+
+# Shared flattened-forest exporter and spatial index live next to the groundwater model
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MODEL"))
+from forest import export_forest, export_fused_forest
+from spatial_index import SpatialIndex
+
+# Pass --mmap to also save each forest as flat NumPy arrays
+# (<name>.flat.joblib) that soil_server.py memory-maps at startup, so
+# several workers share one copy through the OS page cache.
+SAVE_MMAP_ARTIFACTS = "--mmap" in sys.argv
+
+# Pass --multi-output to also train one RandomForestRegressor for all four
+# soil targets (soil_model_multi.pkl), which soil_server.py prefers over
+# the four separate models: one forest walk per request instead of four.
+# With --mmap the four separate forests are also fused into one flat
+# artifact (soil_model_fused.flat.joblib) that gives their exact answers.
+TRAIN_MULTI_OUTPUT = "--multi-output" in sys.argv
+
+# The trained models are not tracked in git. To produce everything
+# soil_server.py serves, run `python crop_system.py --mmap --multi-output`
+# here, then `python soil_grid.py build` from backend/ (the grid is only
+# served while it matches these models).
 
 # =========================================
 # Helper: safe float input
@@ -99,8 +122,60 @@ joblib.dump(soil_model_P, "soil_model_P.pkl")
 joblib.dump(soil_model_K, "soil_model_K.pkl")
 joblib.dump(soil_model_pH, "soil_model_pH.pkl")
 
+if SAVE_MMAP_ARTIFACTS:
+    export_forest(soil_model_N, "soil_model_N.flat.joblib")
+    export_forest(soil_model_P, "soil_model_P.flat.joblib")
+    export_forest(soil_model_K, "soil_model_K.flat.joblib")
+    export_forest(soil_model_pH, "soil_model_pH.flat.joblib")
+
 print("Soil models (N, P, K, pH) saved.")
 
+if SAVE_MMAP_ARTIFACTS:
+    export_fused_forest(
+        [soil_model_N, soil_model_P, soil_model_K, soil_model_pH],
+        "soil_model_fused.flat.joblib",
+    )
+    print("Fused soil forest saved.")
+
+
+# =========================================
+# 3b. OPTIONAL: ONE MULTI-OUTPUT SOIL MODEL
+#     Same inputs, predicts [N, P, K, pH] together.
+#     Parity with the separate models is checked on a held-out 20%.
+# =========================================
+if TRAIN_MULTI_OUTPUT:
+    print("\n=== TRAINING MULTI-OUTPUT SOIL MODEL ===")
+    soil_target_cols = ["N", "P", "K", "pH"]
+    Y_soil = df[soil_target_cols]
+
+    X_s_train, X_s_test, Y_s_train, Y_s_test = train_test_split(
+        X_soil, Y_soil, test_size=0.2, random_state=42
+    )
+
+    holdout_multi = RandomForestRegressor(n_estimators=200, random_state=42)
+    holdout_multi.fit(X_s_train, Y_s_train)
+    Y_multi = holdout_multi.predict(X_s_test)
+
+    print(f"{'target':<6} {'MAE separate':>13} {'MAE multi':>10} {'R2 separate':>12} {'R2 multi':>9}")
+    for i, col in enumerate(soil_target_cols):
+        separate = RandomForestRegressor(n_estimators=200, random_state=42)
+        separate.fit(X_s_train, Y_s_train[col])
+        y_sep = separate.predict(X_s_test)
+        print(
+            f"{col:<6} "
+            f"{mean_absolute_error(Y_s_test[col], y_sep):>13.4f} "
+            f"{mean_absolute_error(Y_s_test[col], Y_multi[:, i]):>10.4f} "
+            f"{r2_score(Y_s_test[col], y_sep):>12.4f} "
+            f"{r2_score(Y_s_test[col], Y_multi[:, i]):>9.4f}"
+        )
+
+    soil_model_multi = RandomForestRegressor(n_estimators=200, random_state=42)
+    soil_model_multi.fit(X_soil, Y_soil)
+    joblib.dump(soil_model_multi, "soil_model_multi.pkl")
+    if SAVE_MMAP_ARTIFACTS:
+        export_forest(soil_model_multi, "soil_model_multi.flat.joblib")
+    print("Multi-output soil model saved.")
+
 
 # =========================================
 # 4. TRAIN CROP MODEL (classification)
@@ -131,6 +206,8 @@ acc_crop = accuracy_score(y_crop_test, y_pred_crop)
 print(f"Crop classification accuracy: {acc_crop * 100:.2f}%")
 
 joblib.dump(crop_model, "crop_model.pkl")
+if SAVE_MMAP_ARTIFACTS:
+    export_forest(crop_model, "crop_model.flat.joblib")
 print("Crop model saved.")
 
 
@@ -221,21 +298,18 @@ for rank, (cn, pr) in enumerate(zip(top_crops, top_probs), start=1):
 # =========================================
 print("\n=== FINDING NEAREST DATA ROW IN SAME REGION ===")
 
-df_same_region = df[df["Region"] == user_region_name].copy()
+# One haversine BallTree per region (shared with soil_server.py)
+sample_index = SpatialIndex(df["Latitude"], df["Longitude"], groups=df["Region"])
 
-if df_same_region.empty:
+scope = "same region"
+if user_region_name not in set(df["Region"]):
     print("No rows found in this region, using entire dataset as fallback.")
-    df_same_region = df.copy()
-
-df_same_region["DistToUser"] = np.sqrt(
-    (df_same_region["Latitude"] - user_latitude) ** 2 +
-    (df_same_region["Longitude"] - user_longitude) ** 2
-)
+    scope = "entire dataset"
 
-nearest_idx = df_same_region["DistToUser"].idxmin()
-nearest_row = df_same_region.loc[nearest_idx]
+nearest_pos, nearest_km = sample_index.nearest(user_latitude, user_longitude, k=1, group=user_region_name)
+nearest_row = df.iloc[nearest_pos[0]]
 
-print("Nearest dataset row (same region):")
+print(f"Nearest dataset row ({scope}, {nearest_km[0]:.2f} km away):")
 print(nearest_row[["Latitude", "Longitude", "N", "P", "K", "pH", "Crop"]])
 
 
@@ -294,8 +368,4 @@ print(f"\nUpdated: {csv_name}")
 print("Preview of this prediction:")
 print(user_result_df)
 
-# Clean up helper column
-if "DistToUser" in df_same_region.columns:
-    df_same_region.drop(columns=["DistToUser"], inplace=True)
-
 print("\nDone.")